@@ -0,0 +1,270 @@
+"""Maintenance commands. Run from the app directory: python cli.py <command> --help"""
+import argparse
+import csv
+import gzip
+import io
+import os
+import time
+from datetime import datetime
+
+from bson import json_util
+from bson.objectid import ObjectId
+from config import MONGODB_URL, SOFTWARE_NAME
+from pymongo import ASCENDING, InsertOne, MongoClient, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+EXPORTABLE_COLLECTIONS = ["users", "payments", "sessions"]
+PROGRESS_INTERVAL = 5
+
+
+def get_sync_db():
+    return MongoClient(MONGODB_URL)[SOFTWARE_NAME]
+
+
+def backfill_paid(args):
+    """Compute users.last_paid_at from the approved payments history"""
+    db = get_sync_db()
+    pipeline = [
+        {"$match": {"status": "approved"}},
+        {"$group": {"_id": "$user_id", "last_paid_at": {"$max": "$payment_date"}}},
+    ]
+
+    started = time.monotonic()
+    batch = []
+    updated = 0
+    for row in db.payments.aggregate(pipeline, allowDiskUse=True, batchSize=args.batch_size):
+        batch.append(UpdateOne({"_id": row["_id"]}, {"$max": {"last_paid_at": row["last_paid_at"]}}))
+        if len(batch) >= args.batch_size:
+            updated += db.users.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += db.users.bulk_write(batch, ordered=False).modified_count
+
+    print(f"Updated last_paid_at for {updated} users in {time.monotonic() - started:.1f}s")
+
+
+class Progress:
+    """Prints rows/s every PROGRESS_INTERVAL seconds and once at the end"""
+
+    def __init__(self, verb: str, collection: str, rows: int = 0):
+        self.verb = verb
+        self.collection = collection
+        self.rows = rows
+        self.new_rows = 0
+        self.started = time.monotonic()
+        self.reported = self.started
+
+    def add(self, rows: int):
+        self.rows += rows
+        self.new_rows += rows
+        now = time.monotonic()
+        if now - self.reported >= PROGRESS_INTERVAL:
+            self.reported = now
+            print(f"{self.verb} {self.rows} {self.collection} rows ({self.rate():.0f} rows/s)")
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.new_rows / elapsed if elapsed else 0.0
+
+    def finish(self):
+        elapsed = time.monotonic() - self.started
+        print(f"{self.verb} {self.rows} {self.collection} rows in {elapsed:.1f}s ({self.rate():.0f} rows/s)")
+
+
+def load_checkpoint(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json_util.loads(f.read())
+
+
+def save_checkpoint(path: str, state: dict):
+    # Write then rename, so a crash never leaves a half-written checkpoint behind
+    with open(f"{path}.tmp", "w") as f:
+        f.write(json_util.dumps(state))
+    os.replace(f"{path}.tmp", path)
+
+
+def csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json_util.dumps(value)
+    return value
+
+
+def format_batch(documents: list, output_format: str, fields: list, header: bool) -> str:
+    buffer = io.StringIO()
+    if output_format == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+        if header:
+            writer.writeheader()
+        for document in documents:
+            writer.writerow({field: csv_cell(document.get(field)) for field in fields})
+    else:
+        for document in documents:
+            buffer.write(json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS))
+            buffer.write("\n")
+    return buffer.getvalue()
+
+
+def write_chunk(output, data: str, compress: bool):
+    # Each chunk is a complete gzip member, so the file can be cut back to any checkpoint
+    if compress:
+        with gzip.GzipFile(fileobj=output, mode="wb") as member:
+            member.write(data.encode())
+    else:
+        output.write(data.encode())
+    output.flush()
+
+
+def export_collection(args):
+    """Stream a collection to NDJSON or CSV, gzipped when the output name ends in .gz"""
+    db = get_sync_db()
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    compress = args.output.endswith(".gz")
+
+    state = load_checkpoint(checkpoint_path)
+    if state:
+        output = open(args.output, "r+b")
+        output.seek(state["offset"])
+        output.truncate()
+        print(f"Resuming {args.collection} export after {state['rows']} rows")
+    else:
+        fields = args.fields.split(",") if args.fields else None
+        if fields and "_id" not in fields:
+            fields.insert(0, "_id")
+        state = {"last_id": None, "rows": 0, "offset": 0, "fields": fields}
+        output = open(args.output, "wb")
+
+    query = {"_id": {"$gt": state["last_id"]}} if state["last_id"] is not None else {}
+    projection = dict.fromkeys(state["fields"], True) if state["fields"] else None
+    cursor = db[args.collection].find(query, projection, sort=[("_id", ASCENDING)], batch_size=args.batch_size)
+    progress = Progress("Exported", args.collection, state["rows"])
+
+    def flush(batch):
+        if state["fields"] is None and args.format == "csv":
+            # Without --fields, CSV columns are the fields of the first document
+            state["fields"] = list(batch[0])
+        data = format_batch(batch, args.format, state["fields"], header=state["rows"] == 0)
+        write_chunk(output, data, compress)
+        state["last_id"] = batch[-1]["_id"]
+        state["rows"] += len(batch)
+        state["offset"] = output.tell()
+        save_checkpoint(checkpoint_path, state)
+        progress.add(len(batch))
+
+    with output:
+        batch = []
+        for document in cursor:
+            batch.append(document)
+            if len(batch) >= args.batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    progress.finish()
+
+
+def import_collection(args):
+    """Load an NDJSON export (optionally .gz) back into a collection with bulk writes"""
+    db = get_sync_db()
+    checkpoint_path = args.checkpoint or f"{args.input}.checkpoint"
+    state = load_checkpoint(checkpoint_path) or {"lines": 0, "written": 0, "errors": 0}
+    if state["lines"]:
+        print(f"Resuming {args.collection} import after line {state['lines']}")
+
+    def to_operation(document):
+        if args.mode == "upsert":
+            return ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+        return InsertOne(document)
+
+    progress = Progress("Imported", args.collection, state["lines"])
+
+    def flush(operations):
+        try:
+            result = db[args.collection].bulk_write(operations, ordered=args.ordered)
+            written = result.inserted_count + result.upserted_count + result.modified_count
+            failed = 0
+        except BulkWriteError as e:
+            details = e.details
+            written = details["nInserted"] + details["nUpserted"] + details["nModified"]
+            failed = len(details["writeErrors"])
+            first_error = details["writeErrors"][0]
+            if args.ordered:
+                # An ordered chunk stops at its first error; resume from that document
+                state["lines"] += first_error["index"]
+                state["written"] += written
+                save_checkpoint(checkpoint_path, state)
+                raise SystemExit(
+                    f"Import stopped at line {state['lines'] + 1}: {first_error['errmsg']} "
+                    f"(checkpoint saved to {checkpoint_path})"
+                )
+            print(f"{failed} documents failed in chunk at line {state['lines'] + 1}, e.g. {first_error['errmsg']}")
+
+        state["lines"] += len(operations)
+        state["written"] += written
+        state["errors"] += failed
+        save_checkpoint(checkpoint_path, state)
+        progress.add(len(operations))
+
+    opener = gzip.open if args.input.endswith(".gz") else open
+    with opener(args.input, "rt") as source:
+        for _ in range(state["lines"]):
+            next(source)
+
+        operations = []
+        for line in source:
+            operations.append(to_operation(json_util.loads(line)))
+            if len(operations) >= args.batch_size:
+                flush(operations)
+                operations = []
+        if operations:
+            flush(operations)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    progress.finish()
+    print(f"{state['written']} documents written, {state['errors']} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"{SOFTWARE_NAME} maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-paid", help=backfill_paid.__doc__)
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    backfill.set_defaults(func=backfill_paid)
+
+    export = commands.add_parser("export", help=export_collection.__doc__)
+    export.add_argument("collection", choices=EXPORTABLE_COLLECTIONS)
+    export.add_argument("--output", required=True, help="Destination file; a .gz suffix compresses it")
+    export.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    export.add_argument("--fields", help="Comma-separated fields to export (default: all)")
+    export.add_argument("--batch-size", type=int, default=1000)
+    export.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    export.set_defaults(func=export_collection)
+
+    load = commands.add_parser("import", help=import_collection.__doc__)
+    load.add_argument("collection", choices=EXPORTABLE_COLLECTIONS)
+    load.add_argument("--input", required=True, help="NDJSON file written by export; .gz is decompressed")
+    load.add_argument("--mode", choices=["insert", "upsert"], default="insert",
+                      help="insert fails on existing _ids, upsert replaces them")
+    load.add_argument("--ordered", action="store_true", help="Stop at the first failed write")
+    load.add_argument("--batch-size", type=int, default=1000)
+    load.add_argument("--checkpoint", help="Checkpoint file (default: <input>.checkpoint)")
+    load.set_defaults(func=import_collection)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
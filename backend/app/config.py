@@ -10,21 +10,104 @@ COMPANY_NAME = os.getenv("COMPANY_NAME")
 
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = "HS256"
+# Verify access tokens by signature and expiry alone, checking only an in-memory revocation list
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "false").lower() == "true"
+REVOCATION_POLL_INTERVAL = float(os.getenv("REVOCATION_POLL_INTERVAL", "5"))
+REVOCATION_BLOOM_BITS = int(os.getenv("REVOCATION_BLOOM_BITS", str(1 << 20)))
+REVOCATION_BLOOM_HASHES = int(os.getenv("REVOCATION_BLOOM_HASHES", "7"))
 
 MERCADO_PAGO_ACCESS_TOKEN = os.getenv("MERCADO_PAGO_ACCESS_TOKEN")
 MERCADO_PAGO_PUBLIC_KEY = os.getenv("MERCADO_PAGO_PUBLIC_KEY")
+MERCADO_PAGO_API_URL = os.getenv("MERCADO_PAGO_API_URL", "https://api.mercadopago.com")
+MERCADO_PAGO_READ_TIMEOUT = float(os.getenv("MERCADO_PAGO_READ_TIMEOUT", "5"))
+MERCADO_PAGO_WRITE_TIMEOUT = float(os.getenv("MERCADO_PAGO_WRITE_TIMEOUT", "15"))
+MERCADO_PAGO_MAX_RETRIES = int(os.getenv("MERCADO_PAGO_MAX_RETRIES", "2"))
+MERCADO_PAGO_RETRY_BUDGET = float(os.getenv("MERCADO_PAGO_RETRY_BUDGET", "0.1"))
+MERCADO_PAGO_BREAKER_THRESHOLD = int(os.getenv("MERCADO_PAGO_BREAKER_THRESHOLD", "5"))
+MERCADO_PAGO_BREAKER_RESET = float(os.getenv("MERCADO_PAGO_BREAKER_RESET", "30"))
 CREDIT_VALUE = float(os.getenv("CREDIT_VALUE", "1.0"))
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
 
 FACEBOOK_CLIENT_ID = os.getenv("FACEBOOK_CLIENT_ID")
 FACEBOOK_CLIENT_SECRET = os.getenv("FACEBOOK_CLIENT_SECRET")
+FACEBOOK_GRAPH_URL = os.getenv("FACEBOOK_GRAPH_URL", "https://graph.facebook.com")
 
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT"))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
 EMAIL_FROM = os.getenv("EMAIL_FROM")
+EMAIL_COALESCE_SECONDS = float(os.getenv("EMAIL_COALESCE_SECONDS", "60"))
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL", "5"))
+EMAIL_SEND_LEASE_SECONDS = float(os.getenv("EMAIL_SEND_LEASE_SECONDS", "120"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
 
-BASE_URL = os.getenv("BASE_URL")
\ No newline at end of file
+BASE_URL = os.getenv("BASE_URL")
+
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+
+SESSION_ACTIVITY_FLUSH_INTERVAL = float(os.getenv("SESSION_ACTIVITY_FLUSH_INTERVAL", "30"))
+SESSION_ACTIVITY_MAX_PENDING = int(os.getenv("SESSION_ACTIVITY_MAX_PENDING", "5000"))
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+PAYMENT_METHODS_TTL = float(os.getenv("PAYMENT_METHODS_TTL", "3600"))
+
+CREDIT_LEASE_BLOCK = float(os.getenv("CREDIT_LEASE_BLOCK", "0"))
+CREDIT_LEASE_SECONDS = float(os.getenv("CREDIT_LEASE_SECONDS", "30"))
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "60"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "10"))
+WEBHOOK_EVENT_RETENTION_DAYS = int(os.getenv("WEBHOOK_EVENT_RETENTION_DAYS", "7"))
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "5"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+PROFILE_HEADER_TOKEN = os.getenv("PROFILE_HEADER_TOKEN")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_QUEUE_STATS_TTL = float(os.getenv("METRICS_QUEUE_STATS_TTL", "15"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "250"))
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "50"))
+
+PASSWORD_THROTTLE_ENABLED = os.getenv("PASSWORD_THROTTLE_ENABLED", "true").lower() == "true"
+PASSWORD_IP_BURST = int(os.getenv("PASSWORD_IP_BURST", "20"))
+PASSWORD_IP_PER_MINUTE = float(os.getenv("PASSWORD_IP_PER_MINUTE", "20"))
+PASSWORD_EMAIL_BURST = int(os.getenv("PASSWORD_EMAIL_BURST", "5"))
+PASSWORD_EMAIL_PER_MINUTE = float(os.getenv("PASSWORD_EMAIL_PER_MINUTE", "3"))
+THROTTLE_MAX_KEYS = int(os.getenv("THROTTLE_MAX_KEYS", "100000"))
+PASSWORD_CONCURRENCY = int(os.getenv("PASSWORD_CONCURRENCY", str(PASSWORD_HASH_WORKERS * 2)))
+PAYMENT_CONCURRENCY = int(os.getenv("PAYMENT_CONCURRENCY", "32"))
+LOAD_SHED_QUEUE_TARGET_MS = float(os.getenv("LOAD_SHED_QUEUE_TARGET_MS", "50"))
+
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "15"))
+SERVER_BIND = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+SERVER_MAX_REQUESTS = int(os.getenv("SERVER_MAX_REQUESTS", "10000"))
+SERVER_MAX_REQUESTS_JITTER = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "1000"))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE", "5"))
+
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "60"))
+RECONCILE_MIN_AGE_SECONDS = float(os.getenv("RECONCILE_MIN_AGE_SECONDS", "120"))
+RECONCILE_MAX_AGE_HOURS = float(os.getenv("RECONCILE_MAX_AGE_HOURS", "72"))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "100"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "4"))
+RECONCILE_MAX_RPS = float(os.getenv("RECONCILE_MAX_RPS", "5"))
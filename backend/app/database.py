@@ -1,17 +1,84 @@
-from config import MONGODB_URL, SOFTWARE_NAME
-from pymongo import MongoClient
+from config import MONGODB_URL, SOFTWARE_NAME, WEBHOOK_EVENT_RETENTION_DAYS
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from utils.metrics import MongoCommandListener
 
 client = None
-db = None
 
-def init_db():
-    global client, db
-    db = MongoClient(MONGODB_URL)
+# Every index the application's queries rely on, per collection
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("credit_leases.expires_at", ASCENDING)], name="credit_leases_expires_at", sparse=True),
+    ],
+    "sessions": [
+        IndexModel([("invalidate_id", ASCENDING)], name="invalidate_id_unique", unique=True),
+        # Mongo removes sessions once their refresh token has expired
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "revoked_sessions": [
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at"),
+        # Revocations only matter until the revoked access tokens expire
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "payments": [
+        IndexModel([("payment_id", ASCENDING)], name="payment_id_unique", unique=True),
+        IndexModel(
+            [("user_id", ASCENDING), ("payment_date", DESCENDING), ("_id", DESCENDING)],
+            name="user_id_payment_date_id"
+        ),
+        # Only payments still waiting for credits, walked oldest first by the reconciler
+        IndexModel(
+            [("payment_date", ASCENDING), ("_id", ASCENDING)],
+            name="unreconciled_payment_date_id",
+            partialFilterExpression={"credits_added": False}
+        ),
+    ],
+    "email_outbox": [
+        IndexModel([("pending", ASCENDING), ("not_before", ASCENDING)], name="pending_not_before"),
+        IndexModel([("sending_until", ASCENDING)], name="sending_until", sparse=True),
+    ],
+    "webhook_events": [
+        IndexModel([("status", ASCENDING), ("received_at", ASCENDING)], name="status_received_at"),
+        IndexModel([("payment_id", ASCENDING), ("status", ASCENDING)], name="payment_id_status"),
+        IndexModel(
+            [("processed_at", ASCENDING)],
+            name="processed_at_ttl",
+            expireAfterSeconds=WEBHOOK_EVENT_RETENTION_DAYS * 86400
+        ),
+    ],
+}
+
+async def init_db():
+    global client
+    client = AsyncIOMotorClient(MONGODB_URL, event_listeners=[MongoCommandListener()])
+    await ensure_indexes()
 
 def get_db():
-    return db[SOFTWARE_NAME]
+    return client[SOFTWARE_NAME]
 
 def close_db():
     global client
     if client:
         client.close()
+        client = None
+
+async def ensure_indexes():
+    db = get_db()
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        for index in indexes:
+            try:
+                await collection.create_indexes([index])
+            except OperationFailure as e:
+                print(f"Could not create index {collection_name}.{index.document['name']}: {e}")
+
+        existing = set((await collection.index_information()).keys())
+        declared = {index.document["name"] for index in indexes} | {"_id_"}
+        missing = declared - existing
+        extra = existing - declared
+        if missing:
+            print(f"Missing indexes on {collection_name}: {', '.join(sorted(missing))}")
+        if extra:
+            print(f"Undeclared indexes on {collection_name}: {', '.join(sorted(extra))}")
@@ -0,0 +1,48 @@
+# Production server: `gunicorn -c gunicorn.conf.py` from the app directory
+import os
+import shutil
+import tempfile
+
+from config import (
+    SERVER_BIND,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_KEEPALIVE,
+    SERVER_MAX_REQUESTS,
+    SERVER_MAX_REQUESTS_JITTER,
+    SERVER_WORKERS,
+    SOFTWARE_NAME,
+)
+
+wsgi_app = "main:app"
+worker_class = "worker.ProductionWorker"
+bind = SERVER_BIND
+workers = SERVER_WORKERS
+reuse_port = True
+keepalive = SERVER_KEEPALIVE
+
+# Recycle workers after a jittered number of requests so they don't all restart together
+max_requests = SERVER_MAX_REQUESTS
+max_requests_jitter = SERVER_MAX_REQUESTS_JITTER
+
+# On SIGTERM workers stop accepting, finish in-flight requests and run the app's
+# shutdown (lease release, activity flush) for up to this long before being killed
+graceful_timeout = SERVER_GRACEFUL_TIMEOUT
+
+# The app is deliberately not preloaded: each worker imports it after the fork and
+# opens its own Mongo and HTTP pools in the lifespan handler.
+preload_app = False
+
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), f"{SOFTWARE_NAME or 'app'}-prometheus")
+)
+
+
+def on_starting(server):
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
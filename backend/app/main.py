@@ -1,33 +1,93 @@
 import asyncio
+import os
+import time
 from contextlib import asynccontextmanager
-from datetime import datetime
 
 import uvicorn
-from config import SOFTWARE_NAME
-from database import close_db, get_db, init_db
-from fastapi import BackgroundTasks, FastAPI
-from routers import auth, legal, payment, protected
+from config import AUTH_STATELESS, METRICS_QUEUE_STATS_TTL, SOFTWARE_NAME
+from database import close_db, init_db
+from fastapi import BackgroundTasks, Depends, FastAPI, Request
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+from routers import admin, auth, legal, payment, protected
+from utils.credit_leases import credit_leases
+from utils.email_outbox import email_outbox
+from utils.google_auth import google_certs
+from utils.http_client import close_http_client, init_http_client
+from utils.leader import background_leader
+from utils.metrics import (
+    EMAIL_OUTBOX_PENDING,
+    REQUEST_LATENCY,
+    REQUESTS_IN_FLIGHT,
+    WEBHOOK_QUEUE_DEPTH,
+    WEBHOOK_QUEUE_LAG,
+    stats_collector,
+)
+from utils.payment_reconciler import payment_reconciler
+from utils.profiler import request_profiler
+from utils.rate_limit import password_limiter, payment_limiter
+from utils.revocation import revocation_list
+from utils.security import password_executor, require_metrics_access, session_cache
+from utils.session_activity import session_activity
+from utils.user_cache import user_cache
+from utils.webhook_queue import webhook_queue
+
+stats_collector.register("session_cache", session_cache.stats)
+stats_collector.register("user_cache", user_cache.stats)
+stats_collector.register("google_certs", google_certs.stats)
+stats_collector.register("session_activity", session_activity.stats)
+stats_collector.register("revocation_list", revocation_list.stats)
+stats_collector.register("password_limiter", password_limiter.stats)
+stats_collector.register("payment_limiter", payment_limiter.stats)
+stats_collector.register("background_leader", background_leader.stats)
+stats_collector.register("payment_reconciler", payment_reconciler.stats)
+REGISTRY.register(stats_collector)
+
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    # Under gunicorn every worker writes its samples to this directory and any of them
+    # can serve the aggregate; the stats collector still reports the serving worker only.
+    metrics_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(metrics_registry)
+    metrics_registry.register(stats_collector)
+else:
+    metrics_registry = REGISTRY
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
+    await init_db()
+    init_http_client()
 
-    asyncio.create_task(cleanup_expired_sessions())
+    background_tasks = [
+        asyncio.create_task(session_activity.run()),
+        asyncio.create_task(payment.payment_method_index.run()),
+        asyncio.create_task(credit_leases.run()),
+        # Queue consumers are lease-safe, but one worker is enough to drain them
+        asyncio.create_task(background_leader.run([
+            email_outbox.run,
+            webhook_queue.run,
+            payment_reconciler.run,
+            credit_leases.run_sweeper,
+        ])),
+    ]
+    if AUTH_STATELESS:
+        await revocation_list.load()
+        background_tasks.append(asyncio.create_task(revocation_list.run()))
 
     yield
+    for task in background_tasks:
+        task.cancel()
+    await background_leader.resign()
+    await email_outbox.close()
+    await credit_leases.release_all()
+    try:
+        await session_activity.flush()
+    except Exception as e:
+        print(f"Error flushing session activity: {e}")
+    password_executor.shutdown(wait=False)
+    await close_http_client()
     close_db()
 
-async def cleanup_expired_sessions():
-    while True:
-        try:
-            db = get_db()
-            db.sessions.delete_many({"expires_at": {"$lt": datetime.utcnow()}})
-            await asyncio.sleep(3600)  # Run every hour
-        except Exception as e:
-            print(f"Error cleaning up sessions: {e}")
-            await asyncio.sleep(60)
-
 app = FastAPI(
     lifespan=lifespan,
     title=f"{SOFTWARE_NAME} API",
@@ -37,10 +97,58 @@ app = FastAPI(
     docs_url="/swagger"
     )
 
-app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
-app.include_router(payment.router, prefix="/payment", tags=["Payment"])
+app.include_router(auth.router, prefix="/auth", tags=["Authentication"], dependencies=[Depends(request_profiler)])
+app.include_router(payment.router, prefix="/payment", tags=["Payment"], dependencies=[Depends(request_profiler)])
 app.include_router(protected.router, prefix="/test", tags=["Test (Restricted Routes)"])
 app.include_router(legal.router, prefix="/legal", tags=["Legal"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
+
+# Label values of the in-flight gauge: the prefixes mounted above plus the app's own pages.
+# Anything else is reported as "unmatched", so scanners probing random URLs can't add series.
+ROUTE_GROUPS = frozenset(["/auth", "/payment", "/test", "/legal", "/admin", "/metrics", app.docs_url, app.redoc_url,
+                          app.openapi_url])
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    group = "/" + request.url.path.strip("/").split("/", 1)[0]
+    if group not in ROUTE_GROUPS:
+        group = "unmatched"
+    in_flight = REQUESTS_IN_FLIGHT.labels(group)
+    in_flight.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+        REQUEST_LATENCY.labels(request.method, route, status).observe(time.perf_counter() - started)
+
+
+queue_stats_refreshed_at = None
+
+
+async def refresh_queue_gauges():
+    # The queue sizes cost collection counts, so scrapes reuse them for METRICS_QUEUE_STATS_TTL seconds
+    global queue_stats_refreshed_at
+    now = time.monotonic()
+    if queue_stats_refreshed_at is not None and now - queue_stats_refreshed_at < METRICS_QUEUE_STATS_TTL:
+        return
+    queue_stats_refreshed_at = now
+    webhook_stats = await webhook_queue.stats()
+    WEBHOOK_QUEUE_DEPTH.set(webhook_stats["depth"])
+    WEBHOOK_QUEUE_LAG.set(webhook_stats["lag_seconds"])
+    EMAIL_OUTBOX_PENDING.set((await email_outbox.stats())["pending"])
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+async def metrics():
+    await refresh_queue_gauges()
+    return Response(generate_latest(metrics_registry), media_type=CONTENT_TYPE_LATEST)
 
 if __name__ == "__main__":
+    # Development server; use `gunicorn -c gunicorn.conf.py` in production
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -31,10 +31,11 @@ class PaymentResponse(BaseModel):
 
 class PaginatedPaymentResponse(BaseModel):
     items: List[PaymentResponse]
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 class PixPaymentCreate(BaseModel):
     amount: Decimal = Field(..., decimal_places=2)
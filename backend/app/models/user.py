@@ -43,4 +43,7 @@ class TokenResponse(BaseModel):
     access_token: str
     refresh_token: str
     token_type: str = "bearer"
-    data: UserResponse
\ No newline at end of file
+    data: UserResponse
+
+class LoginResponse(BaseModel):
+    data: UserResponse
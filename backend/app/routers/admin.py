@@ -0,0 +1,29 @@
+import os
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+from utils.profiler import request_profiler
+from utils.security import get_admin_user
+
+router = APIRouter()
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    current_user: str = Depends(get_admin_user),
+    seconds: float = Query(10, gt=0, le=120, description="How long to sample this worker for")
+):
+    collapsed = await request_profiler.profile_worker(seconds)
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": f'attachment; filename="profile-{os.getpid()}.folded"'}
+    )
+
+@router.get("/profile/requests")
+async def slow_request_profiles(
+    current_user: str = Depends(get_admin_user),
+    include_stacks: bool = Query(False, description="Include the collapsed stacks of each request")
+):
+    profiles = list(request_profiler.recent)
+    if not include_stacks:
+        profiles = [{k: v for k, v in profile.items() if k != "collapsed"} for profile in profiles]
+    return {"pid": os.getpid(), "profiles": profiles}
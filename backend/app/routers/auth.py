@@ -1,5 +1,4 @@
-import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime
 from urllib.parse import unquote_plus
 
 import jwt
@@ -13,14 +12,27 @@ from config import (
     JWT_SECRET,
 )
 from database import get_db
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse, RedirectResponse, Response
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from models.user import GoogleLogin, TokenRefresh, UserAcceptTerms, UserChangePassword, UserCreate, UserLogin
-from utils.email_utils import create_verification_token, send_verification_email, verify_email_token
+from models.user import (
+    GoogleLogin,
+    LoginResponse,
+    TokenRefresh,
+    TokenResponse,
+    UserAcceptTerms,
+    UserChangePassword,
+    UserCreate,
+    UserLogin,
+)
+from utils.email_outbox import email_outbox
+from utils.email_utils import verify_email_token
 from utils.facebook_auth import get_facebook_auth_url, get_facebook_token, get_facebook_user_info
 from utils.google_auth import get_google_auth_url, get_google_token, verify_google_token
+from utils.metrics import OAUTH_CALLBACK_ERRORS
+from utils.rate_limit import password_limiter, password_throttle
 from utils.security import (
+    ACCESS_TOKEN_LIFETIME,
     clear_auth_cookies,
     create_user_response,
     get_current_user,
@@ -30,21 +42,19 @@ from utils.security import (
     verify_password,
     verify_token,
 )
+from utils.user_cache import user_cache
 
 router = APIRouter()
 security = HTTPBearer()
 
-async def send_email_async(to_email: str, token: str):
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, send_verification_email, to_email, token)
-
-@router.post("/register")
-async def register(user: UserCreate, background_tasks: BackgroundTasks):
+@router.post("/register", response_model=TokenResponse, dependencies=[Depends(password_limiter)])
+async def register(request: Request, user: UserCreate):
+    password_throttle.check(request, user.email)
     db = get_db()
-    existing_user = db.users.find_one({"email": user.email})
+    existing_user = await db.users.find_one({"email": user.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     new_user = {
         "email": user.email,
         "username": user.username,
@@ -54,24 +64,24 @@ async def register(user: UserCreate, background_tasks: BackgroundTasks):
         "created_at": datetime.utcnow(),
         "terms_accepted": False
     }
-    result = db.users.insert_one(new_user)
+    result = await db.users.insert_one(new_user)
     new_user["_id"] = result.inserted_id
 
-    verification_token = create_verification_token(user.email)
-    background_tasks.add_task(send_email_async, user.email, verification_token)
+    await email_outbox.enqueue_verification(user.email)
 
-    return create_user_response(new_user)
+    return await create_user_response(new_user)
 
-@router.post("/login")
-async def login(response: Response, user: UserLogin):
+@router.post("/login", response_model=LoginResponse, dependencies=[Depends(password_limiter)])
+async def login(request: Request, response: Response, user: UserLogin):
+    password_throttle.check(request, user.email)
     db = get_db()
-    db_user = db.users.find_one({"email": user.email})
-    if not db_user or not verify_password(user.password, db_user["password"]):
+    db_user = await db.users.find_one({"email": user.email})
+    if not db_user or not await verify_password(user.password, db_user["password"]):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     if not db_user.get("email_verified", False):
         raise HTTPException(status_code=403, detail="Email not verified")
 
-    user_response = create_user_response(db_user)
+    user_response = await create_user_response(db_user)
     set_auth_cookies(response, user_response["access_token"], user_response["refresh_token"])
 
     return {"data": user_response["data"]}
@@ -83,12 +93,11 @@ async def refresh_token(response: Response, request: Request):
         raise HTTPException(status_code=401, detail="No refresh token")
 
     try:
-        payload = verify_token(refresh_token, "refresh")
+        payload = await verify_token(refresh_token, "refresh")
         user_id = payload.get("user_id")
         invalidate_id = payload.get("invalidate_id")
 
-        db = get_db()
-        user = db.users.find_one({"_id": ObjectId(user_id)})
+        user = await user_cache.get_by_id(ObjectId(user_id))
 
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -97,7 +106,7 @@ async def refresh_token(response: Response, request: Request):
             {
                 "user_id": str(user["_id"]),
                 "sub": user["email"],
-                "exp": datetime.utcnow() + timedelta(hours=1),
+                "exp": datetime.utcnow() + ACCESS_TOKEN_LIFETIME,
                 "type": "access",
                 "invalidate_id": invalidate_id
             },
@@ -119,7 +128,7 @@ async def logout(response: Response, request: Request):
             invalidate_id = payload.get("invalidate_id")
 
             if invalidate_id:
-                invalidate_session(invalidate_id)
+                await invalidate_session(invalidate_id)
         except jwt.InvalidTokenError:
             pass
 
@@ -133,10 +142,11 @@ async def verify_email(token: str):
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
     db = get_db()
-    result = db.users.update_one(
+    result = await db.users.update_one(
         {"email": email},
         {"$set": {"email_verified": True}}
     )
+    user_cache.invalidate(email)
 
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -144,16 +154,14 @@ async def verify_email(token: str):
     return {"message": "Email verified successfully"}
 
 @router.post("/resend-verification")
-async def resend_verification(email: str, background_tasks: BackgroundTasks):
-    db = get_db()
-    user = db.users.find_one({"email": email})
+async def resend_verification(email: str):
+    user = await user_cache.get_by_email(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if user.get("email_verified", False):
         raise HTTPException(status_code=400, detail="Email already verified")
 
-    verification_token = create_verification_token(email)
-    background_tasks.add_task(send_email_async, email, verification_token)
+    await email_outbox.enqueue_verification(email)
 
     return {"message": "Verification email resent"}
 
@@ -163,7 +171,7 @@ async def login_google(request: Request):
     redirect_uri = str(request.url_for('google_auth_callback'))
     return RedirectResponse(get_google_auth_url(redirect_uri))
 
-@router.get("/login/google/callback")
+@router.get("/login/google/callback", response_model=TokenResponse)
 async def google_auth_callback(request: Request):
     """Handle Google Sign-In callback"""
     try:
@@ -175,11 +183,11 @@ async def google_auth_callback(request: Request):
         code = unquote_plus(params['code'])
         redirect_uri = str(request.url_for('google_auth_callback'))
 
-        token = get_google_token(code, redirect_uri)
-        idinfo = verify_google_token(token)
+        token = await get_google_token(code, redirect_uri)
+        idinfo = await verify_google_token(token)
 
         db = get_db()
-        user = db.users.find_one({"email": idinfo["email"]})
+        user = await db.users.find_one({"email": idinfo["email"]})
 
         if not user:
             new_user = {
@@ -189,32 +197,34 @@ async def google_auth_callback(request: Request):
                 "credits": 0,
                 "email_verified": True  # Google emails are pre-verified
             }
-            result = db.users.insert_one(new_user)
+            result = await db.users.insert_one(new_user)
             new_user["_id"] = result.inserted_id
             user = new_user
         elif "google_id" not in user:
-            db.users.update_one({"_id": user["_id"]}, {"$set": {"google_id": idinfo["sub"]}})
+            await db.users.update_one({"_id": user["_id"]}, {"$set": {"google_id": idinfo["sub"]}})
+            user_cache.invalidate(user["email"])
 
-        return create_user_response(user)
+        return await create_user_response(user)
 
     except Exception as e:
-        print(f"Error in google_auth_callback: {str(e)}")
+        OAUTH_CALLBACK_ERRORS.labels("google").inc()
         raise HTTPException(status_code=400, detail=f"Error processing Google callback: {str(e)}")
 
-@router.post("/change-password")
-async def change_password(user_data: UserChangePassword, current_user: str = Depends(get_current_user)):
+@router.post("/change-password", dependencies=[Depends(password_limiter)])
+async def change_password(request: Request, user_data: UserChangePassword, current_user: str = Depends(get_current_user)):
+    password_throttle.check(request, current_user)
     db = get_db()
-    db_user = db.users.find_one({"email": current_user})
-    if not db_user or not verify_password(user_data.old_password, db_user["password"]):
+    db_user = await db.users.find_one({"email": current_user})
+    if not db_user or not await verify_password(user_data.old_password, db_user["password"]):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    new_hashed_password = get_password_hash(user_data.new_password)
-    db.users.update_one({"email": current_user}, {"$set": {"password": new_hashed_password}})
+    new_hashed_password = await get_password_hash(user_data.new_password)
+    await db.users.update_one({"email": current_user}, {"$set": {"password": new_hashed_password}})
+    user_cache.invalidate(current_user)
     return {"message": "Password changed successfully"}
 
 @router.get("/user")
 async def get_user_info(current_user: str = Depends(get_current_user)):
-    db = get_db()
-    user = db.users.find_one({"email": current_user})
+    user = await user_cache.get_by_email(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {
@@ -238,7 +248,7 @@ async def login_facebook(request: Request):
     redirect_uri = str(request.url_for('facebook_auth_callback'))
     return RedirectResponse(get_facebook_auth_url(redirect_uri))
 
-@router.get("/login/facebook/callback")
+@router.get("/login/facebook/callback", response_model=TokenResponse)
 async def facebook_auth_callback(request: Request):
     """Handle Facebook Sign-In callback"""
     try:
@@ -247,11 +257,13 @@ async def facebook_auth_callback(request: Request):
             raise HTTPException(status_code=400, detail="Missing authorization code")
 
         redirect_uri = str(request.url_for('facebook_auth_callback'))
-        access_token = get_facebook_token(params['code'], redirect_uri)
-        user_info = get_facebook_user_info(access_token)
+        # The profile request needs the exchanged token, so the two calls can't overlap;
+        # they do share one pooled keep-alive connection to the Graph API.
+        access_token = await get_facebook_token(params['code'], redirect_uri)
+        user_info = await get_facebook_user_info(access_token)
 
         db = get_db()
-        user = db.users.find_one({"email": user_info["email"]})
+        user = await db.users.find_one({"email": user_info["email"]})
 
         if not user:
             new_user = {
@@ -262,17 +274,18 @@ async def facebook_auth_callback(request: Request):
                 "email_verified": True,
                 "created_at": datetime.utcnow(),
             }
-            result = db.users.insert_one(new_user)
+            result = await db.users.insert_one(new_user)
             new_user["_id"] = result.inserted_id
             user = new_user
         elif "facebook_id" not in user:
-            db.users.update_one(
+            await db.users.update_one(
                 {"_id": user["_id"]},
                 {"$set": {"facebook_id": user_info["id"]}}
             )
+            user_cache.invalidate(user["email"])
 
-        return create_user_response(user)
+        return await create_user_response(user)
 
     except Exception as e:
-        print(f"Error in facebook_auth_callback: {str(e)}")
+        OAUTH_CALLBACK_ERRORS.labels("facebook").inc()
         raise HTTPException(status_code=400, detail=f"Error processing Facebook callback: {str(e)}")
@@ -2,19 +2,19 @@ from database import get_db
 from fastapi import APIRouter, Depends, HTTPException
 from models.user import UserAcceptTerms
 from utils.security import get_current_user
+from utils.user_cache import user_cache
 
 router = APIRouter()
 
 @router.post("/accept-terms")
 async def accept_terms(terms: UserAcceptTerms, current_user: str = Depends(get_current_user)):
     db = get_db()
-    user = db.users.find_one({"email": current_user})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    db.users.update_one(
+    result = await db.users.update_one(
         {"email": current_user},
         {"$set": {"terms_accepted": terms.accept}}
     )
+    user_cache.invalidate(current_user)
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
 
     return {"message": "Terms and conditions acceptance status updated", "terms_accepted": terms.accept}
\ No newline at end of file
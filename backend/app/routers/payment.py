@@ -1,11 +1,11 @@
-import re
+import base64
+import json
 from datetime import datetime
 from math import ceil
 from typing import Optional
 
-import mercadopago
 from bson import ObjectId
-from config import CREDIT_VALUE, MERCADO_PAGO_ACCESS_TOKEN
+from config import PAYMENT_METHODS_TTL
 from database import get_db
 from fastapi import APIRouter, Depends, HTTPException, Query
 from models.payment import (
@@ -17,32 +17,29 @@ from models.payment import (
     PixPaymentResponse,
 )
 from models.user import UserAddCredits
+from pymongo import DESCENDING
+from utils.credit_operations import grant_payment_credits
+from utils.mercadopago_gateway import mercadopago_gateway
+from utils.payment_methods import PaymentMethodIndex
+from utils.rate_limit import payment_limiter
 from utils.security import get_current_user
+from utils.user_cache import user_cache
+from utils.webhook_queue import webhook_queue
 
 router = APIRouter()
-sdk = mercadopago.SDK(MERCADO_PAGO_ACCESS_TOKEN)
 
-def get_payment_method_id(card_number: str):
-    payment_methods = sdk.payment_methods().list_all()
+payment_method_index = PaymentMethodIndex(mercadopago_gateway.list_payment_methods, ttl=PAYMENT_METHODS_TTL)
 
-    for method in payment_methods["response"]:
-        if method["payment_type_id"] == "credit_card":
-            for setting in method["settings"]:
-                if "bin" in setting:
-                    pattern = setting["bin"].get("pattern")
-                    exclusion_pattern = setting["bin"].get("exclusion_pattern")
+async def get_payment_method_id(card_number: str):
+    method_id = await payment_method_index.lookup(card_number)
+    if not method_id:
+        raise HTTPException(status_code=400, detail="Unable to determine payment method")
+    return method_id
 
-                    if pattern and re.match(pattern, card_number):
-                        if exclusion_pattern and re.match(exclusion_pattern, card_number):
-                            continue
-                        return method["id"]
-
-    raise HTTPException(status_code=400, detail="Unable to determine payment method")
-
-@router.post("/create_payment", response_model=PaymentResponse)
+@router.post("/create_payment", response_model=PaymentResponse, dependencies=[Depends(payment_limiter)])
 async def create_payment(payment: PaymentCreate, card: Optional[CardInfo] = None, current_user: str = Depends(get_current_user)):
     db = get_db()
-    user = db.users.find_one({"email": current_user})
+    user = await user_cache.get_by_email(current_user)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -70,7 +67,10 @@ async def create_payment(payment: PaymentCreate, card: Optional[CardInfo] = None
             }
         }
 
-        card_token_result = sdk.card_token().create(card_data)
+        # Resolved first, so a card token is never created for a payment that can't go ahead
+        payment_data["payment_method_id"] = await get_payment_method_id(card.card_number)
+
+        card_token_result = await mercadopago_gateway.create_card_token(card_data)
 
         if card_token_result["status"] != 201:
             raise HTTPException(status_code=400, detail="Failed to create card token")
@@ -78,18 +78,17 @@ async def create_payment(payment: PaymentCreate, card: Optional[CardInfo] = None
         card_token = card_token_result["response"]["id"]
         payment_data["token"] = card_token
         payment_data["installments"] = payment.installments
-        payment_data["payment_method_id"] = get_payment_method_id(card.card_number)
 
     elif payment.payment_method == "pix":
         payment_data["payment_method_id"] = "pix"
     else:
         raise HTTPException(status_code=400, detail="Invalid payment method")
 
-    payment_response = sdk.payment().create(payment_data)
+    payment_response = await mercadopago_gateway.create_payment(payment_data)
 
     if payment_response["status"] == 201:
         payment_result = payment_response["response"]
-        db.payments.insert_one({
+        await db.payments.insert_one({
             "user_id": user["_id"],
             "payment_id": payment_result["id"],
             "status": payment_result["status"],
@@ -101,15 +100,7 @@ async def create_payment(payment: PaymentCreate, card: Optional[CardInfo] = None
         })
 
         if payment.payment_method == "credit_card" and payment_result["status"] == "approved":
-            credits_to_add = float(payment.amount) / CREDIT_VALUE
-            db.users.update_one(
-                {"_id": user["_id"]},
-                {"$inc": {"credits": credits_to_add}}
-            )
-            db.payments.update_one(
-                {"payment_id": payment_result["id"]},
-                {"$set": {"credits_added": True}}
-            )
+            await grant_payment_credits(payment_result["id"], float(payment.amount))
 
         return PaymentResponse(
             id=str(payment_result["id"]),
@@ -121,10 +112,10 @@ async def create_payment(payment: PaymentCreate, card: Optional[CardInfo] = None
     else:
         raise HTTPException(status_code=400, detail="Payment creation failed")
 
-@router.post("/create_pix_payment", response_model=PixPaymentResponse)
+@router.post("/create_pix_payment", response_model=PixPaymentResponse, dependencies=[Depends(payment_limiter)])
 async def create_pix_payment(payment: PixPaymentCreate, current_user: str = Depends(get_current_user)):
     db = get_db()
-    user = db.users.find_one({"email": current_user})
+    user = await user_cache.get_by_email(current_user)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -138,11 +129,11 @@ async def create_pix_payment(payment: PixPaymentCreate, current_user: str = Depe
         }
     }
 
-    payment_response = sdk.payment().create(payment_data)
+    payment_response = await mercadopago_gateway.create_payment(payment_data)
 
     if payment_response["status"] == 201:
         payment_result = payment_response["response"]
-        db.payments.insert_one({
+        await db.payments.insert_one({
             "user_id": user["_id"],
             "payment_id": str(payment_result["id"]),
             "status": payment_result["status"],
@@ -163,40 +154,48 @@ async def create_pix_payment(payment: PixPaymentCreate, current_user: str = Depe
 
 @router.post("/webhook")
 async def payment_webhook(data: dict):
-    if data["type"] == "payment":
-        payment_id = data["data"]["id"]
-        payment_info = sdk.payment().get(payment_id)
-
-        if payment_info["status"] == 200:
-            payment = payment_info["response"]
-            db = get_db()
-            db_payment = db.payments.find_one({"payment_id": payment_id})
-
-            if db_payment and not db_payment["credits_added"] and payment["status"] == "approved":
-                print("in")
-                user = db.users.find_one({"_id": db_payment["user_id"]})
-                if user:
-                    credits_to_add = float(payment["transaction_amount"]) / CREDIT_VALUE
-                    db.users.update_one(
-                        {"_id": user["_id"]},
-                        {"$inc": {"credits": credits_to_add}}
-                    )
-                    db.payments.update_one(
-                        {"payment_id": payment_id},
-                        {"$set": {"credits_added": True, "status": "approved"}}
-                    )
-
+    # Acknowledge right away; the queue fetches the payment and grants credits
+    await webhook_queue.enqueue(data)
     return {"status": "success"}
 
+PAYMENT_PROJECTION = {
+    "payment_id": True,
+    "status": True,
+    "amount": True,
+    "description": True,
+    "payment_method": True,
+    "payment_date": True,
+}
+
+def encode_payment_cursor(payment: dict) -> str:
+    cursor = json.dumps({"d": payment["payment_date"].isoformat(), "i": str(payment["_id"])})
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+def decode_payment_cursor(after: str) -> dict:
+    """Turn an opaque `after` token into a filter for the rows that follow it"""
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(after.encode()))
+        payment_date = datetime.fromisoformat(cursor["d"])
+        last_id = ObjectId(cursor["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {"$or": [
+        {"payment_date": {"$lt": payment_date}},
+        {"payment_date": payment_date, "_id": {"$lt": last_id}},
+    ]}
+
 @router.get("/payments", response_model=PaginatedPaymentResponse)
 async def get_payments(
     current_user: str = Depends(get_current_user),
     payment_id: Optional[int] = None,
     page: int = Query(1, ge=1),
-    size: int = Query(10, ge=1, le=100)
+    size: int = Query(10, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor; replaces page"),
+    include_total: bool = Query(True, description="Count all matching payments (costs a scan of the user's payments)")
 ):
     db = get_db()
-    user = db.users.find_one({"email": current_user})
+    user = await user_cache.get_by_email(current_user)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -205,35 +204,50 @@ async def get_payments(
     if payment_id:
         filter_query["payment_id"] = payment_id
 
-    total = db.payments.count_documents(filter_query)
+    total = None
+    total_pages = None
+    if include_total:
+        total = await db.payments.count_documents(filter_query)
+        total_pages = ceil(total / size)
 
-    total_pages = ceil(total / size)
-    skip = (page - 1) * size
+    if after:
+        filter_query.update(decode_payment_cursor(after))
+        page = None
 
-    payments = db.payments.find(filter_query).skip(skip).limit(size)
+    # Newest first; _id breaks ties so the order is stable across pages
+    query = db.payments.find(filter_query, projection=PAYMENT_PROJECTION).sort(
+        [("payment_date", DESCENDING), ("_id", DESCENDING)]
+    )
+    if page:
+        query = query.skip((page - 1) * size)
+
+    payments = await query.limit(size + 1).to_list(length=size + 1)
+    next_cursor = encode_payment_cursor(payments[size - 1]) if len(payments) > size else None
+    payments = payments[:size]
 
     items = [
-        PaymentResponse(
-            id=str(payment["payment_id"]),
-            status=payment["status"],
-            amount=payment["amount"],
-            description=payment["description"],
-            payment_method=payment["payment_method"]
-        ) for payment in payments
+        {
+            "id": str(payment["payment_id"]),
+            "status": payment["status"],
+            "amount": payment["amount"],
+            "description": payment["description"],
+            "payment_method": payment["payment_method"],
+        } for payment in payments
     ]
 
-    return PaginatedPaymentResponse(
-        items=items,
-        total=total,
-        page=page,
-        size=size,
-        pages=total_pages
-    )
+    # Serialized straight to JSON bytes by pydantic through the route's response_model
+    return {
+        "items": items,
+        "total": total,
+        "page": page,
+        "size": size,
+        "pages": total_pages,
+        "next_cursor": next_cursor,
+    }
 
 @router.get("/user_credits")
 async def get_user_credits(current_user: str = Depends(get_current_user)):
-    db = get_db()
-    user = db.users.find_one({"email": current_user})
+    user = await user_cache.get_by_email(current_user)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from utils.credit_operations import check_and_deduct_credits
+from utils.credit_leases import credit_leases
 from utils.paid_user import get_paid_user
 from utils.security import get_current_user
 
@@ -15,7 +15,7 @@ async def paid_feature(
     days: int = Query(30, ge=1, description="Number of days since last payment")
 ):
     try:
-        is_paid = get_paid_user(current_user, days)
+        is_paid = await get_paid_user(current_user, days)
         return {
             "message": f"This is a paid feature (last payment within {days} days)",
             "user": current_user
@@ -29,10 +29,11 @@ async def credit_based_feature(
     credits_required: float = Query(1.0, ge=0, description="Number of credits required for this operation")
 ):
     try:
-        check_and_deduct_credits(current_user, credits_required)
+        credits_remaining = await credit_leases.consume(current_user, credits_required)
         return {
             "message": f"This is a credit-based feature (cost: {credits_required} credits)",
-            "user": current_user
+            "user": current_user,
+            "credits_remaining": credits_remaining
         }
     except HTTPException as e:
         raise e
\ No newline at end of file
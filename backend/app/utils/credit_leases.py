@@ -0,0 +1,200 @@
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from config import CREDIT_LEASE_BLOCK, CREDIT_LEASE_SECONDS
+from database import get_db
+from pymongo import ReturnDocument
+from utils.credit_operations import check_and_deduct_credits
+from utils.metrics import BACKGROUND_ERRORS
+from utils.user_cache import user_cache
+
+
+class CreditLease:
+    def __init__(self, lease_id: str, amount: float, balance: float, duration: float):
+        self.id = lease_id
+        self.amount = amount
+        self.remaining = amount
+        self.balance = balance
+        self.expires_at = time.monotonic() + duration
+
+    def expired(self) -> bool:
+        return self.expires_at <= time.monotonic()
+
+
+class CreditLeaseManager:
+    """Serves frequent small deductions from blocks of credits reserved per user.
+
+    A lease moves `block` credits from the user's `credits` to `reserved_credits`
+    in one atomic update. Deductions are then taken from memory, and whatever is
+    left goes back to `credits` when the lease expires or the process shuts down.
+
+    Each lease is also recorded in the user's `credit_leases` array with its
+    expiry, so reservations of a worker that died are returned by
+    sweep_stranded(). Returning a lease is conditional on that entry, so it
+    happens at most once.
+    """
+
+    def __init__(self, block: float, duration: float):
+        self.block = block
+        self.duration = duration
+        self._leases = {}
+        # user email -> [lock, number of coroutines holding or waiting for it]
+        self._locks = {}
+
+    @asynccontextmanager
+    async def _user_lock(self, user_email: str):
+        entry = self._locks.get(user_email)
+        if entry is None:
+            entry = self._locks[user_email] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            # Only drop the lock once nobody holds or waits for it
+            if entry[1] == 0:
+                del self._locks[user_email]
+
+    async def consume(self, user_email: str, amount: float) -> float:
+        """Deduct credits and return the user's available balance"""
+        if self.block <= 0 or amount > self.block:
+            return await check_and_deduct_credits(user_email, amount)
+
+        lease = self._leases.get(user_email)
+        if lease and not lease.expired() and lease.remaining >= amount:
+            lease.remaining -= amount
+            return lease.balance + lease.remaining
+
+        async with self._user_lock(user_email):
+            lease = self._leases.get(user_email)
+            if lease and not lease.expired() and lease.remaining >= amount:
+                lease.remaining -= amount
+                return lease.balance + lease.remaining
+
+            if lease:
+                await self._release(user_email, lease)
+
+            lease = await self._reserve(user_email)
+            if not lease:
+                # Not enough credits for a whole block; charge this call directly
+                return await check_and_deduct_credits(user_email, amount)
+
+            lease.remaining -= amount
+            return lease.balance + lease.remaining
+
+    async def _reserve(self, user_email: str):
+        lease_id = uuid.uuid4().hex
+        db = get_db()
+        user = await db.users.find_one_and_update(
+            {"email": user_email, "credits": {"$gte": self.block}},
+            {
+                "$inc": {"credits": -self.block, "reserved_credits": self.block},
+                "$push": {"credit_leases": {
+                    "id": lease_id,
+                    "amount": self.block,
+                    "expires_at": datetime.utcnow() + timedelta(seconds=self.duration),
+                }},
+            },
+            projection={"credits": True},
+            return_document=ReturnDocument.AFTER
+        )
+        user_cache.invalidate(user_email)
+        if not user:
+            return None
+
+        lease = CreditLease(lease_id, self.block, user["credits"], self.duration)
+        self._leases[user_email] = lease
+        return lease
+
+    async def _release(self, user_email: str, lease: CreditLease):
+        # Take the lease out of consume()'s lock-free path before awaiting the write,
+        # or deductions made meanwhile would come after the $inc captured `remaining`
+        if self._leases.get(user_email) is lease:
+            del self._leases[user_email]
+        db = get_db()
+        try:
+            await db.users.update_one(
+                {"email": user_email, "credit_leases.id": lease.id},
+                {
+                    "$inc": {"credits": lease.remaining, "reserved_credits": -lease.amount},
+                    "$pull": {"credit_leases": {"id": lease.id}},
+                }
+            )
+        except Exception:
+            # Nothing was written, so the lease is still ours to spend or release later
+            self._leases.setdefault(user_email, lease)
+            raise
+        user_cache.invalidate(user_email)
+
+    async def release_expired(self):
+        for user_email, lease in list(self._leases.items()):
+            # A consume() in progress replaces the expired lease itself
+            if not lease.expired() or user_email in self._locks:
+                continue
+            async with self._user_lock(user_email):
+                if self._leases.get(user_email) is lease:
+                    await self._release(user_email, lease)
+
+    async def release_all(self):
+        for user_email, lease in list(self._leases.items()):
+            try:
+                async with self._user_lock(user_email):
+                    if self._leases.get(user_email) is lease:
+                        await self._release(user_email, lease)
+            except Exception as e:
+                BACKGROUND_ERRORS.labels("credit_leases").inc()
+                print(f"Error releasing credit lease for {user_email}: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(max(self.duration / 2, 1))
+            try:
+                await self.release_expired()
+            except Exception as e:
+                BACKGROUND_ERRORS.labels("credit_leases").inc()
+                print(f"Error releasing expired credit leases: {e}")
+
+    async def sweep_stranded(self) -> int:
+        """Return reservations whose lease expired more than one lease duration ago.
+
+        Live workers release their own leases on expiry, so anything older belongs
+        to a worker that died. What it had already spent from the block is unknown,
+        so the whole block goes back to the user.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.duration)
+        db = get_db()
+        swept = 0
+        async for user in db.users.find(
+            {"credit_leases.expires_at": {"$lte": cutoff}}, projection={"email": True, "credit_leases": True}
+        ):
+            for lease in user["credit_leases"]:
+                if lease["expires_at"] > cutoff:
+                    continue
+                result = await db.users.update_one(
+                    {"_id": user["_id"], "credit_leases.id": lease["id"]},
+                    {
+                        "$inc": {"credits": lease["amount"], "reserved_credits": -lease["amount"]},
+                        "$pull": {"credit_leases": {"id": lease["id"]}},
+                    }
+                )
+                swept += result.modified_count
+            user_cache.invalidate(user["email"])
+        return swept
+
+    async def run_sweeper(self):
+        while True:
+            await asyncio.sleep(max(self.duration, 1))
+            try:
+                swept = await self.sweep_stranded()
+                if swept:
+                    print(f"Returned {swept} stranded credit leases")
+            except Exception as e:
+                BACKGROUND_ERRORS.labels("credit_lease_sweeper").inc()
+                print(f"Error returning stranded credit leases: {e}")
+
+
+credit_leases = CreditLeaseManager(block=CREDIT_LEASE_BLOCK, duration=CREDIT_LEASE_SECONDS)
@@ -1,20 +1,93 @@
+from config import CREDIT_VALUE
 from database import get_db
 from fastapi import HTTPException
+from pymongo import ReturnDocument, UpdateOne
+from utils.user_cache import user_cache
 
 
-def check_and_deduct_credits(user_email: str, required_credits: float):
+def deduction_filter(user_filter: dict, required_credits: float) -> dict:
+    if required_credits <= 0:
+        return user_filter
+    return {**user_filter, "credits": {"$gte": required_credits}}
+
+
+async def check_and_deduct_credits(user_email: str, required_credits: float) -> float:
+    """Atomically deduct credits if the balance covers them and return the new balance"""
     db = get_db()
-    user = db.users.find_one({"email": user_email})
+    user = await db.users.find_one_and_update(
+        deduction_filter({"email": user_email}, required_credits),
+        {"$inc": {"credits": -required_credits}},
+        projection={"credits": True},
+        return_document=ReturnDocument.AFTER
+    )
+    user_cache.invalidate(user_email)
 
     if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if user.get("credits", 0) < required_credits:
+        if not await db.users.count_documents({"email": user_email}, limit=1):
+            raise HTTPException(status_code=404, detail="User not found")
         raise HTTPException(status_code=403, detail="Insufficient credits")
 
-    db.users.update_one(
-        {"_id": user["_id"]},
-        {"$inc": {"credits": -required_credits}}
+    return user["credits"]
+
+
+async def deduct_credits_bulk(deductions: dict[str, float]) -> int:
+    """Deduct credits from several users in one round trip.
+
+    Users whose balance does not cover their amount are left untouched.
+    Returns the number of users that were charged.
+    """
+    if not deductions:
+        return 0
+
+    db = get_db()
+    result = await db.users.bulk_write(
+        [
+            UpdateOne(deduction_filter({"email": email}, amount), {"$inc": {"credits": -amount}})
+            for email, amount in deductions.items()
+        ],
+        ordered=False
     )
+    for email in deductions:
+        user_cache.invalidate(email)
+    return result.modified_count
+
 
-    return True
\ No newline at end of file
+def payment_id_filter(payment_id) -> dict:
+    """Match a payment id whether it was stored as a string or a number"""
+    payment_id = str(payment_id)
+    return {"$in": [payment_id, int(payment_id)]} if payment_id.isdigit() else payment_id
+
+
+async def grant_payment_credits(payment_id, amount: float) -> bool:
+    """Credit an approved payment to its user exactly once.
+
+    The user update only matches while the payment isn't in the user's
+    credited_payments, so concurrent webhook deliveries or reconciliation passes
+    can't grant twice. credits_added is flipped afterwards; a crash in between
+    leaves it False and the next attempt just flips it.
+    """
+    db = get_db()
+    payment = await db.payments.find_one(
+        {"payment_id": payment_id_filter(payment_id), "credits_added": False},
+        projection={"user_id": True, "payment_date": True}
+    )
+    if not payment:
+        return False
+
+    user = await db.users.find_one_and_update(
+        {"_id": payment["user_id"], "credited_payments": {"$ne": payment["_id"]}},
+        {
+            "$inc": {"credits": amount / CREDIT_VALUE},
+            "$max": {"last_paid_at": payment["payment_date"]},
+            "$push": {"credited_payments": payment["_id"]},
+        },
+        projection={"email": True}
+    )
+    if user:
+        user_cache.invalidate(user["email"])
+
+    await db.payments.update_one(
+        {"_id": payment["_id"], "credits_added": False},
+        {"$set": {"credits_added": True, "status": "approved"}}
+    )
+    return user is not None
@@ -0,0 +1,139 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from config import (
+    EMAIL_COALESCE_SECONDS,
+    EMAIL_MAX_ATTEMPTS,
+    EMAIL_OUTBOX_POLL_INTERVAL,
+    EMAIL_SEND_LEASE_SECONDS,
+    SMTP_POOL_SIZE,
+)
+from database import get_db
+from pymongo import ASCENDING
+from utils.email_utils import build_verification_email, create_verification_token, smtp_pool
+from utils.metrics import BACKGROUND_ERRORS
+
+
+class EmailOutbox:
+    """Durable email queue stored in the email_outbox collection.
+
+    There is one document per (kind, recipient). Requests made while a send is
+    pending, or within `coalesce_window` seconds of the last send, collapse into
+    a single delivery. Workers claim documents atomically and hold a lease while
+    sending, so a crashed worker's message is picked up again once it expires.
+    """
+
+    def __init__(self, pool, coalesce_window: float, poll_interval: float, lease: float, max_attempts: int, concurrency: int):
+        self.pool = pool
+        self.coalesce_window = coalesce_window
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+        self.sent = 0
+        self.failed = 0
+        self._wakeup = None
+
+    async def enqueue_verification(self, to_email: str):
+        now = datetime.utcnow()
+        db = get_db()
+        await db.email_outbox.update_one(
+            {"_id": f"verification:{to_email}"},
+            {
+                "$set": {"kind": "verification", "to": to_email, "pending": True, "requested_at": now},
+                "$setOnInsert": {"not_before": now, "attempts": 0},
+            },
+            upsert=True
+        )
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        db = get_db()
+        return await db.email_outbox.find_one_and_update(
+            {"$or": [
+                {"pending": True, "not_before": {"$lte": now}},
+                {"sending_until": {"$lte": now}},
+            ]},
+            {"$set": {
+                "pending": False,
+                "not_before": now + timedelta(seconds=self.coalesce_window),
+                "sending_until": now + timedelta(seconds=self.lease),
+            }},
+            sort=[("not_before", ASCENDING)]
+        )
+
+    def _build(self, job: dict):
+        if job["kind"] == "verification":
+            return build_verification_email(job["to"], create_verification_token(job["to"]))
+        raise ValueError(f"Unknown email kind: {job['kind']}")
+
+    async def _deliver(self, job: dict):
+        db = get_db()
+        try:
+            await self.pool.send(self._build(job))
+        except Exception as e:
+            self.failed += 1
+            attempts = job.get("attempts", 0) + 1
+            update = {"$set": {"last_error": str(e)}, "$unset": {"sending_until": ""}}
+            if attempts < self.max_attempts:
+                update["$set"].update({
+                    "pending": True,
+                    "not_before": datetime.utcnow() + timedelta(seconds=min(30 * 2 ** attempts, 3600)),
+                    "attempts": attempts,
+                })
+            else:
+                update["$set"]["attempts"] = 0
+            await db.email_outbox.update_one({"_id": job["_id"]}, update)
+            BACKGROUND_ERRORS.labels("email_send").inc()
+            print(f"Error sending email to {job['to']}: {e}")
+            return
+
+        self.sent += 1
+        await db.email_outbox.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"sent_at": datetime.utcnow(), "attempts": 0}, "$unset": {"sending_until": "", "last_error": ""}}
+        )
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+                if not job:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._deliver(job)
+            except Exception as e:
+                BACKGROUND_ERRORS.labels("email_outbox").inc()
+                print(f"Error processing email outbox: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+
+    async def close(self):
+        await self.pool.close()
+
+    async def stats(self) -> dict:
+        db = get_db()
+        return {
+            "pending": await db.email_outbox.count_documents({"pending": True}),
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+
+email_outbox = EmailOutbox(
+    pool=smtp_pool,
+    coalesce_window=EMAIL_COALESCE_SECONDS,
+    poll_interval=EMAIL_OUTBOX_POLL_INTERVAL,
+    lease=EMAIL_SEND_LEASE_SECONDS,
+    max_attempts=EMAIL_MAX_ATTEMPTS,
+    concurrency=SMTP_POOL_SIZE,
+)
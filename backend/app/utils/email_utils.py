@@ -1,8 +1,10 @@
+import asyncio
 import os
 import smtplib
 from datetime import datetime, timedelta
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from functools import lru_cache
 from string import Template
 
 import jwt
@@ -13,23 +15,30 @@ from config import (
     JWT_ALGORITHM,
     JWT_SECRET,
     SMTP_PASSWORD,
+    SMTP_POOL_SIZE,
     SMTP_PORT,
     SMTP_SERVER,
+    SMTP_STARTTLS,
+    SMTP_TIMEOUT,
     SMTP_USERNAME,
     SOFTWARE_NAME,
 )
+from utils.metrics import time_upstream
 
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates')
 
-def send_verification_email(to_email: str, token: str):
+
+@lru_cache(maxsize=None)
+def load_template(name: str) -> Template:
+    with open(os.path.join(TEMPLATES_DIR, name), 'r') as file:
+        return Template(file.read())
+
+
+def build_verification_email(to_email: str, token: str) -> MIMEMultipart:
     subject = f"Verify your email for {SOFTWARE_NAME}"
     verification_link = f"{BASE_URL}/auth/verify-email?token={token}"
 
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    template_path = os.path.join(current_dir, '..', 'templates', 'email_verification_template.html')
-    with open(template_path, 'r') as file:
-        template = Template(file.read())
-
-    html_content = template.safe_substitute(
+    html_content = load_template('email_verification_template.html').safe_substitute(
         software_name=SOFTWARE_NAME,
         company_name=COMPANY_NAME,
         verification_link=verification_link,
@@ -42,16 +51,71 @@ def send_verification_email(to_email: str, token: str):
     msg['Subject'] = subject
 
     msg.attach(MIMEText(html_content, 'html'))
+    return msg
 
-    try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+
+class SMTPConnectionPool:
+    """Keeps up to `size` authenticated SMTP connections to host:port open between sends"""
+
+    def __init__(self, host: str, port: int, size: int):
+        self.host = host
+        self.port = port
+        self.size = size
+        self._idle = []
+        self._slots = None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
             server.starttls()
+        if SMTP_USERNAME:
             server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg)
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
+        return server
+
+    def _send(self, server, msg):
+        if server is None:
+            server = self._connect()
+        try:
+            try:
+                server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped an idle connection; reconnect once
+                self._close(server)
+                server = None
+                server = self._connect()
+                server.send_message(msg)
+        except Exception:
+            if server is not None:
+                self._close(server)
+            raise
+        return server
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    async def send(self, msg):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            server = self._idle.pop() if self._idle else None
+            with time_upstream("smtp", "send"):
+                server = await loop.run_in_executor(None, self._send, server, msg)
+            self._idle.append(server)
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        idle, self._idle = self._idle, []
+        for server in idle:
+            await loop.run_in_executor(None, self._close, server)
+
+
+smtp_pool = SMTPConnectionPool(SMTP_SERVER, SMTP_PORT, size=SMTP_POOL_SIZE)
+
 
 def create_verification_token(email: str):
     expiration = datetime.utcnow() + timedelta(hours=24)
@@ -69,4 +133,4 @@ def verify_email_token(token: str):
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
-        return None
\ No newline at end of file
+        return None
@@ -1,6 +1,8 @@
-import requests
-from config import FACEBOOK_CLIENT_ID, FACEBOOK_CLIENT_SECRET
+import httpx
+from config import FACEBOOK_CLIENT_ID, FACEBOOK_CLIENT_SECRET, FACEBOOK_GRAPH_URL
 from fastapi import HTTPException
+from utils.http_client import get_http_client
+from utils.metrics import time_upstream
 
 
 def get_facebook_auth_url(redirect_uri: str):
@@ -14,9 +16,9 @@ def get_facebook_auth_url(redirect_uri: str):
     }
     return f"{base_url}?{'&'.join(f'{k}={v}' for k, v in params.items())}"
 
-def get_facebook_token(code: str, redirect_uri: str):
+async def get_facebook_token(code: str, redirect_uri: str):
     """Exchange authorization code for access token"""
-    token_url = "https://graph.facebook.com/v12.0/oauth/access_token"
+    token_url = f"{FACEBOOK_GRAPH_URL}/v12.0/oauth/access_token"
     params = {
         "client_id": FACEBOOK_CLIENT_ID,
         "client_secret": FACEBOOK_CLIENT_SECRET,
@@ -25,23 +27,25 @@ def get_facebook_token(code: str, redirect_uri: str):
     }
 
     try:
-        response = requests.get(token_url, params=params)
-        response.raise_for_status()
+        with time_upstream("facebook", "token"):
+            response = await get_http_client().get(token_url, params=params)
+            response.raise_for_status()
         return response.json()["access_token"]
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=400, detail=f"Failed to retrieve token: {str(e)}")
 
-def get_facebook_user_info(access_token: str):
+async def get_facebook_user_info(access_token: str):
     """Get user information from Facebook"""
-    user_info_url = "https://graph.facebook.com/me"
+    user_info_url = f"{FACEBOOK_GRAPH_URL}/me"
     params = {
         "fields": "id,name,email",
         "access_token": access_token,
     }
 
     try:
-        response = requests.get(user_info_url, params=params)
-        response.raise_for_status()
+        with time_upstream("facebook", "user_info"):
+            response = await get_http_client().get(user_info_url, params=params)
+            response.raise_for_status()
         return response.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=400, detail=f"Failed to retrieve user info: {str(e)}")
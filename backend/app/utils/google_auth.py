@@ -1,19 +1,105 @@
+import asyncio
+import re
+import time
 from urllib.parse import urlencode
 
-import requests
-from config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET
+import httpx
+from config import GOOGLE_CERTS_URL, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_TOKEN_URL
 from fastapi import HTTPException
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
+from google.auth import jwt as google_jwt
+from utils.http_client import get_http_client
+from utils.metrics import time_upstream
 
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
 
-def verify_google_token(token: str):
+
+class GoogleCertsCache:
+    """Google's ID-token signing certificates, cached for their Cache-Control max-age"""
+
+    def __init__(self, url: str, default_max_age: float = 3600):
+        self.url = url
+        self.default_max_age = default_max_age
+        self.certs = None
+        self.fetched_at = 0.0
+        self.expires_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refresh_failures = 0
+        self._lock = None
+        self._refresh_task = None
+
+    async def refresh(self):
+        requested_at = time.monotonic()
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Callers queued behind a fetch reuse its result instead of fetching again
+            if self.fetched_at >= requested_at:
+                return
+            try:
+                with time_upstream("google", "certs"):
+                    response = await get_http_client().get(self.url)
+                    response.raise_for_status()
+                certs = response.json()
+            except Exception:
+                self.refresh_failures += 1
+                raise
+
+            match = MAX_AGE_PATTERN.search(response.headers.get("cache-control", ""))
+            max_age = int(match.group(1)) if match else self.default_max_age
+            self.certs = certs
+            self.fetched_at = time.monotonic()
+            self.expires_at = self.fetched_at + max_age
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+            self._refresh_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def get(self, kid: str = None):
+        now = time.monotonic()
+        # An unknown key id means Google rotated keys; refetch, but at most once a minute
+        known_kid = kid is None or kid in (self.certs or {}) or now - self.fetched_at < 60
+        if self.certs and now < self.expires_at and known_kid:
+            self.hits += 1
+            # Refresh ahead of expiry so requests never wait on the fetch
+            if now > self.expires_at - (self.expires_at - self.fetched_at) * 0.2:
+                self._refresh_in_background()
+            return self.certs
+
+        self.misses += 1
+        try:
+            await self.refresh()
+        except Exception:
+            if not self.certs:
+                raise
+            self.stale_hits += 1
+        return self.certs
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "refresh_failures": self.refresh_failures,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+google_certs = GoogleCertsCache(GOOGLE_CERTS_URL)
+
+
+async def verify_google_token(token: str):
     try:
-        idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), GOOGLE_CLIENT_ID)
+        kid = google_jwt.decode_header(token).get("kid")
+        certs = await google_certs.get(kid)
+        idinfo = google_jwt.decode(token, certs=certs, audience=GOOGLE_CLIENT_ID, clock_skew_in_seconds=10)
         if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
             raise ValueError('Wrong issuer.')
         return idinfo
-    except ValueError as e:
+    except (ValueError, httpx.HTTPError) as e:
         raise HTTPException(status_code=400, detail=f"Invalid token: {str(e)}")
 
 def get_google_auth_url(redirect_uri: str):
@@ -29,9 +115,9 @@ def get_google_auth_url(redirect_uri: str):
     }
     return f"{base_url}?{urlencode(params)}"
 
-def get_google_token(code: str, redirect_uri: str):
+async def get_google_token(code: str, redirect_uri: str):
     """Exchange authorization code for access token"""
-    token_url = "https://oauth2.googleapis.com/token"
+    token_url = GOOGLE_TOKEN_URL
     data = {
         "code": code,
         "client_id": GOOGLE_CLIENT_ID,
@@ -41,9 +127,10 @@ def get_google_token(code: str, redirect_uri: str):
     }
 
     try:
-        response = requests.post(token_url, data=data)
-        response.raise_for_status()
+        with time_upstream("google", "token"):
+            response = await get_http_client().post(token_url, data=data)
+            response.raise_for_status()
         token_data = response.json()
         return token_data["id_token"]
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=400, detail=f"Failed to retrieve token: {str(e)}")
\ No newline at end of file
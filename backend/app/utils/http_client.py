@@ -0,0 +1,27 @@
+import httpx
+from config import HTTP_CONNECT_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_TIMEOUT
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+http_client = None
+
+def init_http_client():
+    global http_client
+    http_client = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+    )
+
+def get_http_client() -> httpx.AsyncClient:
+    return http_client
+
+async def close_http_client():
+    global http_client
+    if http_client:
+        await http_client.aclose()
+        http_client = None
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from config import LEADER_LEASE_SECONDS
+from database import get_db
+from pymongo.errors import DuplicateKeyError
+from utils.metrics import BACKGROUND_ERRORS
+
+
+class LeaderElection:
+    """Runs a set of background jobs in exactly one worker, elected through a lease document
+
+    The holder renews the lease every `lease / 3` seconds. If it dies without
+    resigning, another worker takes over once the lease expires.
+    """
+
+    def __init__(self, name: str, lease: float):
+        self.name = name
+        self.lease = lease
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._renewed_at = None
+        self._tasks = []
+
+    async def _try_acquire(self) -> bool:
+        now = datetime.utcnow()
+        db = get_db()
+        try:
+            await db.leases.find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=self.lease)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Held by another worker: the filter missed and the upsert collided on _id
+            return False
+        self._renewed_at = now
+        return True
+
+    def _start(self, jobs):
+        print(f"{self.holder} is now running {self.name}")
+        self._tasks = [asyncio.create_task(job()) for job in jobs]
+
+    def _stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def run(self, jobs):
+        try:
+            while True:
+                try:
+                    self.is_leader = await self._try_acquire()
+                except Exception as e:
+                    BACKGROUND_ERRORS.labels("leader").inc()
+                    print(f"Error renewing {self.name} lease: {e}")
+                    # Keep going until our lease would have run out anyway
+                    expires_at = self._renewed_at + timedelta(seconds=self.lease) if self._renewed_at else None
+                    self.is_leader = bool(expires_at and expires_at > datetime.utcnow())
+
+                if self.is_leader and not self._tasks:
+                    self._start(jobs)
+                elif not self.is_leader and self._tasks:
+                    self._stop()
+                await asyncio.sleep(self.lease / 3)
+        finally:
+            self._stop()
+
+    async def resign(self):
+        self._stop()
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        try:
+            db = get_db()
+            await db.leases.delete_one({"_id": self.name, "holder": self.holder})
+        except Exception as e:
+            print(f"Error releasing {self.name} lease: {e}")
+
+    def stats(self) -> dict:
+        return {"is_leader": int(self.is_leader), "jobs": len(self._tasks)}
+
+
+background_leader = LeaderElection("background-jobs", lease=LEADER_LEASE_SECONDS)
@@ -0,0 +1,166 @@
+import asyncio
+import random
+import time
+import uuid
+
+import httpx
+from config import (
+    MERCADO_PAGO_ACCESS_TOKEN,
+    MERCADO_PAGO_API_URL,
+    MERCADO_PAGO_BREAKER_RESET,
+    MERCADO_PAGO_BREAKER_THRESHOLD,
+    MERCADO_PAGO_MAX_RETRIES,
+    MERCADO_PAGO_READ_TIMEOUT,
+    MERCADO_PAGO_RETRY_BUDGET,
+    MERCADO_PAGO_WRITE_TIMEOUT,
+)
+from fastapi import HTTPException
+from utils.http_client import get_http_client
+from utils.metrics import UPSTREAM_LATENCY
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and lets one trial call through after `reset_timeout`
+
+    While half-open only that trial call is admitted; it closes the breaker on success
+    and reopens it on failure. A trial that never reports back (e.g. cancelled) frees
+    the slot for another one after `reset_timeout`.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state != "half-open":
+            return state == "closed"
+        now = time.monotonic()
+        if self.probe_started_at is not None and now - self.probe_started_at < self.reset_timeout:
+            return False
+        self.probe_started_at = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self.probe_started_at = None
+
+
+class RetryBudget:
+    """Every call earns `ratio` of a retry, so retries stay a bounded share of traffic"""
+
+    def __init__(self, ratio: float, capacity: float = 10):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+
+    def deposit(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class MercadoPagoGateway:
+    """Async Mercado Pago REST client returning the SDK's {"status", "response"} shape"""
+
+    def __init__(self, base_url: str, access_token: str, read_timeout: float, write_timeout: float,
+                 max_retries: int, retry_budget: RetryBudget, breaker: CircuitBreaker):
+        self.base_url = base_url.rstrip("/")
+        self.access_token = access_token
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.breaker = breaker
+
+    async def _request(self, operation: str, method: str, path: str, timeout: float, retry: bool = False, **kwargs):
+        if not self.breaker.allow():
+            raise HTTPException(status_code=503, detail="Payment gateway unavailable")
+
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+        if method == "POST":
+            headers["X-Idempotency-Key"] = str(uuid.uuid4())
+
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            response = None
+            started = time.perf_counter()
+            try:
+                response = await get_http_client().request(
+                    method, f"{self.base_url}{path}", headers=headers, timeout=timeout, **kwargs
+                )
+                if response.status_code < 500 and response.status_code != 429:
+                    UPSTREAM_LATENCY.labels("mercadopago", operation, "ok").observe(time.perf_counter() - started)
+                    self.breaker.record_success()
+                    return {"status": response.status_code, "response": self._json(response)}
+                error = f"status {response.status_code}"
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+            UPSTREAM_LATENCY.labels("mercadopago", operation, "error").observe(time.perf_counter() - started)
+
+            self.breaker.record_failure()
+            if not retry or attempt >= self.max_retries or not self.breaker.allow() or not self.retry_budget.withdraw():
+                if response is not None:
+                    return {"status": response.status_code, "response": self._json(response)}
+                raise HTTPException(status_code=503, detail=f"Payment gateway unavailable: {error}")
+
+            # Full jitter: sleep anywhere up to the exponential backoff
+            await asyncio.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+            attempt += 1
+
+    def _json(self, response: httpx.Response):
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+    async def create_card_token(self, card_data: dict):
+        return await self._request("create_card_token", "POST", "/v1/card_tokens", self.write_timeout, json=card_data)
+
+    async def create_payment(self, payment_data: dict):
+        return await self._request("create_payment", "POST", "/v1/payments", self.write_timeout, json=payment_data)
+
+    async def get_payment(self, payment_id):
+        return await self._request("get_payment", "GET", f"/v1/payments/{payment_id}", self.read_timeout, retry=True)
+
+    async def search_payments(self, params: dict):
+        return await self._request(
+            "search_payments", "GET", "/v1/payments/search", self.read_timeout, retry=True, params=params
+        )
+
+    async def list_payment_methods(self):
+        return await self._request("list_payment_methods", "GET", "/v1/payment_methods", self.read_timeout, retry=True)
+
+
+mercadopago_gateway = MercadoPagoGateway(
+    base_url=MERCADO_PAGO_API_URL,
+    access_token=MERCADO_PAGO_ACCESS_TOKEN,
+    read_timeout=MERCADO_PAGO_READ_TIMEOUT,
+    write_timeout=MERCADO_PAGO_WRITE_TIMEOUT,
+    max_retries=MERCADO_PAGO_MAX_RETRIES,
+    retry_budget=RetryBudget(ratio=MERCADO_PAGO_RETRY_BUDGET),
+    breaker=CircuitBreaker(threshold=MERCADO_PAGO_BREAKER_THRESHOLD, reset_timeout=MERCADO_PAGO_BREAKER_RESET),
+)
@@ -0,0 +1,120 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served, by top-level path of a known route", ["group"],
+    multiprocess_mode="livesum"
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ["collection", "command", "outcome"]
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds", "Outbound call latency", ["service", "operation", "outcome"]
+)
+BACKGROUND_ERRORS = Counter(
+    "background_task_errors", "Errors raised inside background loops", ["task"]
+)
+OAUTH_CALLBACK_ERRORS = Counter(
+    "oauth_callback_errors", "Failed OAuth callbacks", ["provider"]
+)
+# Measured from Mongo on scrape, so the latest value from any worker is the right one
+WEBHOOK_QUEUE_DEPTH = Gauge(
+    "webhook_queue_depth", "Pending payment webhook events", multiprocess_mode="livemostrecent"
+)
+WEBHOOK_QUEUE_LAG = Gauge(
+    "webhook_queue_lag_seconds", "Age of the oldest pending payment webhook event", multiprocess_mode="livemostrecent"
+)
+EMAIL_OUTBOX_PENDING = Gauge(
+    "email_outbox_pending", "Emails waiting in the outbox", multiprocess_mode="livemostrecent"
+)
+THROTTLED_REQUESTS = Counter(
+    "throttled_requests", "Password requests rejected by a token bucket", ["scope"]
+)
+SHED_REQUESTS = Counter(
+    "shed_requests", "Requests rejected by the adaptive concurrency limiter", ["route_class", "reason"]
+)
+RECONCILED_PAYMENTS = Counter(
+    "reconciled_payments", "Pending payments checked by the reconciler, by result", ["outcome"]
+)
+RECONCILE_GRANT_DELAY = Histogram(
+    "reconcile_grant_delay_seconds", "Time from payment creation to credits granted by the reconciler",
+    buckets=(60, 300, 900, 1800, 3600, 6 * 3600, 24 * 3600, 72 * 3600)
+)
+RECONCILE_LAST_PASS = Gauge(
+    "reconcile_last_pass_timestamp_seconds", "When the last complete reconciliation pass finished",
+    multiprocess_mode="max"
+)
+RECONCILE_PASS_DURATION = Histogram(
+    "reconcile_pass_duration_seconds", "Duration of one reconciliation pass"
+)
+CONCURRENCY_LIMIT = Gauge(
+    "concurrency_limit", "Current adaptive concurrency limit", ["route_class"], multiprocess_mode="liveall"
+)
+
+
+@contextmanager
+def time_upstream(service: str, operation: str):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        UPSTREAM_LATENCY.labels(service, operation, outcome).observe(time.perf_counter() - started)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command, labelled by collection and command name"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def _observe(self, event, outcome: str):
+        collection = self._collections.pop(event.request_id, "")
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name, outcome).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._observe(event, "ok")
+
+    def failed(self, event):
+        self._observe(event, "error")
+
+
+class StatsCollector:
+    """Exposes the stats() dicts of in-process caches and buffers as Prometheus metrics"""
+
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, name: str, stats):
+        self.sources[name] = stats
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        values = GaugeMetricFamily("component_stat", "Other in-process component stats", labels=["component", "stat"])
+        for name, stats in self.sources.items():
+            for key, value in stats().items():
+                if key == "hits":
+                    hits.add_metric([name], value)
+                elif key == "misses":
+                    misses.add_metric([name], value)
+                elif isinstance(value, (int, float)):
+                    values.add_metric([name, key], value)
+        yield hits
+        yield misses
+        yield values
+
+
+stats_collector = StatsCollector()
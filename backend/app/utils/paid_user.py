@@ -1,23 +1,19 @@
 from datetime import datetime, timedelta
 
-from database import get_db
 from fastapi import HTTPException
+from utils.user_cache import user_cache
 
 
-def get_paid_user(current_user: str, days: int):
-    db = get_db()
-    user = db.users.find_one({"email": current_user})
+async def get_paid_user(current_user: str, days: int):
+    user = await user_cache.get_by_email(current_user)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    recent_payment = db.payments.find_one({
-        "user_id": user["_id"],
-        "status": "approved",
-        "payment_date": {"$gte": datetime.utcnow() - timedelta(days=days)}
-    })
-
-    if not recent_payment:
+    # last_paid_at is kept up to date by the payment flow, see grant_payment_credits
+    last_paid_at = user.get("last_paid_at")
+    if not last_paid_at or last_paid_at < datetime.utcnow() - timedelta(days=days):
         raise HTTPException(status_code=403, detail=f"Paid feature: No payment found in the last {days} days")
 
-    return True
\ No newline at end of file
+    return True
+
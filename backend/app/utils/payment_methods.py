@@ -0,0 +1,134 @@
+import asyncio
+import re
+import time
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from fastapi import HTTPException
+from utils.metrics import BACKGROUND_ERRORS
+
+DIGITS = "0123456789"
+
+
+def leading_digits(pattern: str):
+    """Return the set of digits a BIN pattern can start with, or None if unknown"""
+    try:
+        return _first_chars(sre_parse.parse(pattern))
+    except Exception:
+        return None
+
+
+def _first_chars(items):
+    for op, av in items:
+        name = str(op)
+        if name == "AT":
+            continue
+        if name == "LITERAL":
+            return {chr(av)}
+        if name == "IN":
+            chars = set()
+            for item_op, item_av in av:
+                item_name = str(item_op)
+                if item_name == "LITERAL":
+                    chars.add(chr(item_av))
+                elif item_name == "RANGE":
+                    chars.update(chr(c) for c in range(item_av[0], item_av[1] + 1))
+                else:
+                    return None
+            return chars
+        if name == "SUBPATTERN":
+            return _first_chars(av[-1])
+        if name == "BRANCH":
+            chars = set()
+            for branch in av[1]:
+                branch_chars = _first_chars(branch)
+                if branch_chars is None:
+                    return None
+                chars |= branch_chars
+            return chars
+        return None
+    return None
+
+
+class PaymentMethodIndex:
+    """Credit card payment methods with precompiled BIN patterns, grouped by first digit"""
+
+    def __init__(self, fetch_methods, ttl: float):
+        self.fetch_methods = fetch_methods
+        self.ttl = ttl
+        self.loaded_at = None
+        self._buckets = {}
+        self._fallback = []
+        self._refresh_lock = None
+
+    def build(self, methods: list):
+        entries = []
+        for method in methods:
+            if method["payment_type_id"] != "credit_card":
+                continue
+            for setting in method.get("settings", []):
+                if "bin" not in setting:
+                    continue
+                pattern = setting["bin"].get("pattern")
+                exclusion_pattern = setting["bin"].get("exclusion_pattern")
+                if not pattern:
+                    continue
+                entries.append((
+                    leading_digits(pattern),
+                    method["id"],
+                    re.compile(pattern),
+                    re.compile(exclusion_pattern) if exclusion_pattern else None,
+                ))
+
+        # Every bucket keeps the API's ordering, so the first match wins as before
+        buckets = {
+            digit: [entry[1:] for entry in entries if entry[0] is None or digit in entry[0]]
+            for digit in DIGITS
+        }
+        fallback = [entry[1:] for entry in entries if entry[0] is None]
+
+        self._buckets, self._fallback = buckets, fallback
+        self.loaded_at = time.monotonic()
+
+    async def refresh(self):
+        requested_at = time.monotonic()
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            # Callers queued behind a fetch reuse its result instead of fetching again
+            if self.loaded_at is not None and self.loaded_at >= requested_at:
+                return
+            result = await self.fetch_methods()
+            if result["status"] != 200:
+                raise RuntimeError(f"Failed to list payment methods: status {result['status']}")
+            self.build(result["response"])
+
+    async def lookup(self, card_number: str):
+        if self.loaded_at is None:
+            try:
+                await self.refresh()
+            except HTTPException:
+                raise
+            except Exception as e:
+                print(f"Error loading payment methods: {e}")
+                raise HTTPException(status_code=503, detail="Payment methods unavailable, please try again")
+
+        for method_id, pattern, exclusion_pattern in self._buckets.get(card_number[:1], self._fallback):
+            if pattern.match(card_number):
+                if exclusion_pattern and exclusion_pattern.match(card_number):
+                    continue
+                return method_id
+        return None
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+                await asyncio.sleep(self.ttl)
+            except Exception as e:
+                BACKGROUND_ERRORS.labels("payment_methods").inc()
+                print(f"Error refreshing payment methods: {e}")
+                await asyncio.sleep(60)
@@ -0,0 +1,207 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from config import (
+    RECONCILE_BATCH_SIZE,
+    RECONCILE_CONCURRENCY,
+    RECONCILE_INTERVAL,
+    RECONCILE_MAX_AGE_HOURS,
+    RECONCILE_MAX_RPS,
+    RECONCILE_MIN_AGE_SECONDS,
+)
+from database import get_db
+from pymongo import ASCENDING
+from utils.credit_operations import grant_payment_credits
+from utils.mercadopago_gateway import mercadopago_gateway
+from utils.metrics import (
+    BACKGROUND_ERRORS,
+    RECONCILE_GRANT_DELAY,
+    RECONCILE_LAST_PASS,
+    RECONCILE_PASS_DURATION,
+    RECONCILED_PAYMENTS,
+)
+from utils.rate_limit import TokenBucketLimiter
+
+# Statuses that can still end up approved; the rest are final
+OPEN_STATUSES = ["pending", "in_process", "authorized", "approved"]
+
+SEARCH_PAGE_SIZE = 100
+# We store payment_date after Mercado Pago created the payment, so search a little earlier
+SEARCH_MARGIN = timedelta(minutes=10)
+
+
+def search_date(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class PaymentReconciler:
+    """Grants credits for payments whose webhook never arrived
+
+    Walks payments still waiting for credits in payment_date order, and for each
+    batch asks the Mercado Pago search API for every payment created in the
+    batch's time window, falling back to one lookup per payment when the window
+    holds too many payments or a payment isn't in the results. Batches run
+    `concurrency` at a time and every gateway call spends a token from a shared
+    bucket refilled at `max_rps`.
+    """
+
+    def __init__(self, gateway, interval: float, min_age: float, max_age: float, batch_size: int,
+                 concurrency: int, max_rps: float):
+        self.gateway = gateway
+        self.interval = interval
+        self.min_age = timedelta(seconds=min_age)
+        self.max_age = timedelta(seconds=max_age)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.limiter = TokenBucketLimiter(max_rps * 60, burst=max(1, concurrency), max_keys=1)
+        self.passes = 0
+        self.checked = 0
+        self.granted = 0
+        self.last_pass_seconds = 0.0
+
+    async def _throttle(self):
+        while True:
+            wait = self.limiter.take("mercadopago")
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def _batches(self, now: datetime):
+        query = {
+            "credits_added": False,
+            "status": {"$in": OPEN_STATUSES},
+            "payment_date": {"$gte": now - self.max_age, "$lte": now - self.min_age},
+        }
+        db = get_db()
+        while True:
+            batch = await db.payments.find(
+                query, projection={"payment_id": True, "payment_date": True, "status": True}
+            ).sort([("payment_date", ASCENDING), ("_id", ASCENDING)]).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                return
+            yield batch
+            if len(batch) < self.batch_size:
+                return
+
+            last = batch[-1]
+            query["$or"] = [
+                {"payment_date": {"$gt": last["payment_date"]}},
+                {"payment_date": last["payment_date"], "_id": {"$gt": last["_id"]}},
+            ]
+
+    async def _search(self, begin: datetime, end: datetime):
+        """Every payment created between begin and end by id, or None if there are too many to page through"""
+        found = {}
+        offset = 0
+        while True:
+            await self._throttle()
+            result = await self.gateway.search_payments({
+                "range": "date_created",
+                "begin_date": search_date(begin),
+                "end_date": search_date(end),
+                "sort": "date_created",
+                "criteria": "asc",
+                "limit": SEARCH_PAGE_SIZE,
+                "offset": offset,
+            })
+            if result["status"] != 200:
+                raise RuntimeError(f"Payment search failed with status {result['status']}")
+
+            page = result["response"].get("results", [])
+            total = result["response"].get("paging", {}).get("total", 0)
+            if total > self.batch_size * 5:
+                return None
+
+            for payment in page:
+                found[str(payment["id"])] = payment
+            offset += len(page)
+            if not page or offset >= total:
+                return found
+
+    async def _lookup(self, payment_id):
+        await self._throttle()
+        result = await self.gateway.get_payment(payment_id)
+        if result["status"] == 404:
+            return None
+        if result["status"] != 200:
+            raise RuntimeError(f"Payment lookup failed with status {result['status']}")
+        return result["response"]
+
+    async def _apply(self, row: dict, payment: dict):
+        if payment is None:
+            outcome = "missing"
+        elif payment["status"] == "approved":
+            granted = await grant_payment_credits(row["payment_id"], float(payment["transaction_amount"]))
+            outcome = "granted" if granted else "unchanged"
+            if granted:
+                self.granted += 1
+                RECONCILE_GRANT_DELAY.observe((datetime.utcnow() - row["payment_date"]).total_seconds())
+        elif payment["status"] != row["status"]:
+            db = get_db()
+            await db.payments.update_one(
+                {"_id": row["_id"], "credits_added": False}, {"$set": {"status": payment["status"]}}
+            )
+            outcome = "updated"
+        else:
+            outcome = "unchanged"
+
+        self.checked += 1
+        RECONCILED_PAYMENTS.labels(outcome).inc()
+
+    async def _reconcile_batch(self, batch: list):
+        try:
+            found = await self._search(batch[0]["payment_date"] - SEARCH_MARGIN, batch[-1]["payment_date"])
+            found = found or {}
+            missing = [row for row in batch if str(row["payment_id"]) not in found]
+            lookups = await asyncio.gather(*(self._lookup(row["payment_id"]) for row in missing))
+            found.update((str(row["payment_id"]), payment) for row, payment in zip(missing, lookups))
+
+            for row in batch:
+                await self._apply(row, found.get(str(row["payment_id"])))
+        except Exception as e:
+            BACKGROUND_ERRORS.labels("payment_reconciler").inc()
+            print(f"Error reconciling payments from {batch[0]['payment_date']}: {e}")
+
+    async def reconcile(self):
+        started = time.perf_counter()
+        running = set()
+        async for batch in self._batches(datetime.utcnow()):
+            if len(running) >= self.concurrency:
+                _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            running.add(asyncio.create_task(self._reconcile_batch(batch)))
+        if running:
+            await asyncio.wait(running)
+
+        self.passes += 1
+        self.last_pass_seconds = time.perf_counter() - started
+        RECONCILE_PASS_DURATION.observe(self.last_pass_seconds)
+        RECONCILE_LAST_PASS.set_to_current_time()
+
+    async def run(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                BACKGROUND_ERRORS.labels("payment_reconciler").inc()
+                print(f"Error reconciling payments: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "passes": self.passes,
+            "checked": self.checked,
+            "granted": self.granted,
+            "last_pass_seconds": self.last_pass_seconds,
+        }
+
+
+payment_reconciler = PaymentReconciler(
+    mercadopago_gateway,
+    interval=RECONCILE_INTERVAL,
+    min_age=RECONCILE_MIN_AGE_SECONDS,
+    max_age=RECONCILE_MAX_AGE_HOURS * 3600,
+    batch_size=RECONCILE_BATCH_SIZE,
+    concurrency=RECONCILE_CONCURRENCY,
+    max_rps=RECONCILE_MAX_RPS,
+)
@@ -0,0 +1,207 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from config import (
+    PROFILE_HEADER_TOKEN,
+    PROFILE_HISTORY,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SLOW_MS,
+    PROFILER_INTERVAL,
+)
+from fastapi import HTTPException, Request
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})".replace(";", ":")
+
+
+def collapse_stack(frame, root: str = None) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    if root:
+        labels.append(root)
+    return ";".join(reversed(labels))
+
+
+def format_collapsed(stacks: Counter) -> str:
+    # One "root;...;leaf count" line per stack, the input format of flamegraph.pl and speedscope
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class ProfileSession:
+    """Stacks collected for one profiling window; either every thread or one asyncio task"""
+
+    def __init__(self, thread_id: int = None, loop=None, task=None):
+        self.thread_id = thread_id
+        self.loop = loop
+        self.task = task
+        self.stacks = Counter()
+        self.samples = 0
+
+    def sample(self, frames: dict, thread_names: dict, sampler_id: int, offloaded: dict):
+        if self.task is not None:
+            # Only count samples where the event loop is actually running this request's task,
+            # so concurrent requests on the same loop don't end up in each other's profile.
+            stacks = []
+            frame = frames.get(self.thread_id)
+            if frame is not None and asyncio.current_task(self.loop) is self.task:
+                stacks.append(collapse_stack(frame))
+            # Plus executor threads working for the task, e.g. bcrypt in the password executor
+            for thread_id, task in offloaded.items():
+                frame = frames.get(thread_id)
+                if task is self.task and frame is not None:
+                    stacks.append(collapse_stack(frame, thread_names.get(thread_id, str(thread_id))))
+            for stack in stacks:
+                self.stacks[stack] += 1
+            if stacks:
+                self.samples += 1
+            return
+
+        for thread_id, frame in frames.items():
+            if thread_id == sampler_id:
+                continue
+            self.stacks[collapse_stack(frame, thread_names.get(thread_id, str(thread_id)))] += 1
+        self.samples += 1
+
+    def hot_frames(self, limit: int = 10) -> list:
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [{"frame": frame, "samples": count} for frame, count in leaves.most_common(limit)]
+
+
+class SamplingProfiler:
+    """Samples Python stacks from a background thread via sys._current_frames()
+
+    The sampler thread only runs while at least one session is active, so the
+    cost when nobody is profiling is zero.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        # executor thread id -> the asyncio task it is running a job for
+        self._offloaded = {}
+
+    def start(self, session: ProfileSession):
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, session: ProfileSession):
+        with self._lock:
+            self._sessions.discard(session)
+
+    def run_for(self, task, func, *args):
+        """Runs func(*args) in the calling executor thread, attributing its samples to `task`"""
+        thread_id = threading.get_ident()
+        self._offloaded[thread_id] = task
+        try:
+            return func(*args)
+        finally:
+            del self._offloaded[thread_id]
+
+    def _sample_loop(self):
+        sampler_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                sessions = list(self._sessions)
+            frames = sys._current_frames()
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            offloaded = dict(self._offloaded)
+            for session in sessions:
+                session.sample(frames, thread_names, sampler_id, offloaded)
+            del frames
+
+    async def profile_worker(self, seconds: float) -> ProfileSession:
+        session = ProfileSession()
+        self.start(session)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.stop(session)
+        return session
+
+
+class RequestProfiler:
+    """Profiles a fraction of requests, plus any carrying the profiling header, and keeps the slow ones"""
+
+    header = "X-Profile-Token"
+
+    def __init__(self, profiler: SamplingProfiler, token: str, sample_rate: float, slow_ms: float, history: int):
+        self.profiler = profiler
+        self.token = token
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.recent = deque(maxlen=history)
+        self.worker_busy = False
+
+    def wants(self, request: Request) -> bool:
+        if self.token and request.headers.get(self.header) == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, request: Request):
+        # Router dependency: it runs in the same task as the endpoint, which is what the
+        # session filters on.
+        if not self.wants(request):
+            yield
+            return
+
+        session = ProfileSession(
+            thread_id=threading.get_ident(), loop=asyncio.get_running_loop(), task=asyncio.current_task()
+        )
+        started = time.perf_counter()
+        self.profiler.start(session)
+        try:
+            yield
+        finally:
+            self.profiler.stop(session)
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= self.slow_ms:
+                self.recent.append({
+                    "method": request.method,
+                    "path": request.url.path,
+                    "duration_ms": round(duration_ms, 1),
+                    "started_at": datetime.utcnow(),
+                    "samples": session.samples,
+                    "hot_frames": session.hot_frames(),
+                    "collapsed": format_collapsed(session.stacks),
+                })
+
+    async def profile_worker(self, seconds: float) -> str:
+        if self.worker_busy:
+            raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+
+        self.worker_busy = True
+        try:
+            session = await self.profiler.profile_worker(seconds)
+        finally:
+            self.worker_busy = False
+        return format_collapsed(session.stacks)
+
+
+sampling_profiler = SamplingProfiler(PROFILER_INTERVAL)
+request_profiler = RequestProfiler(
+    sampling_profiler,
+    token=PROFILE_HEADER_TOKEN,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    slow_ms=PROFILE_SLOW_MS,
+    history=PROFILE_HISTORY,
+)
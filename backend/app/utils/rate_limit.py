@@ -0,0 +1,183 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+
+from config import (
+    LOAD_SHED_QUEUE_TARGET_MS,
+    PASSWORD_CONCURRENCY,
+    PASSWORD_EMAIL_BURST,
+    PASSWORD_EMAIL_PER_MINUTE,
+    PASSWORD_IP_BURST,
+    PASSWORD_IP_PER_MINUTE,
+    PASSWORD_THROTTLE_ENABLED,
+    PAYMENT_CONCURRENCY,
+    THROTTLE_MAX_KEYS,
+)
+from fastapi import HTTPException, Request
+from utils.metrics import CONCURRENCY_LIMIT, SHED_REQUESTS, THROTTLED_REQUESTS
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets, keeping only the `max_keys` most recently used keys"""
+
+    def __init__(self, per_minute: float, burst: int, max_keys: int):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """Spends a token for `key`; returns 0 if one was available, else seconds until one is"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class PasswordThrottle:
+    """Caps bcrypt-backed attempts per client IP and per account email; a no-op when disabled"""
+
+    def __init__(self, per_ip: TokenBucketLimiter, per_email: TokenBucketLimiter, enabled: bool = True):
+        self.per_ip = per_ip
+        self.per_email = per_email
+        self.enabled = enabled
+
+    def check(self, request: Request, email: str):
+        if not self.enabled:
+            return
+        ip = request.client.host if request.client else "unknown"
+        for scope, limiter, key in (("ip", self.per_ip, ip), ("email", self.per_email, email.lower())):
+            wait = limiter.take(key)
+            if wait:
+                THROTTLED_REQUESTS.labels(scope).inc()
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many attempts, please try again later",
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+
+
+class AdaptiveConcurrencyLimiter:
+    """Bounds concurrent requests of one route class and sheds the ones that would queue too long
+
+    Requests over the limit wait in a FIFO queue for at most `queue_target` seconds
+    and get a 503 after that, or straight away when the queue is as long as the limit.
+    The limit itself follows the time requests spend in that queue: it shrinks while
+    they wait more than half the target (a standing queue, so more concurrency would
+    only add latency downstream), never below its initial value, and grows by ~1 per
+    `limit` completions while it is saturated and the queue drains quickly.
+    """
+
+    def __init__(self, name: str, initial_limit: int, max_limit: int, queue_target: float):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = float(initial_limit)
+        self.max_limit = max_limit
+        self.queue_target = queue_target
+        self.in_flight = 0
+        self.shed = 0
+        self.queue_delay = 0.0
+        self._waiters = deque()
+        CONCURRENCY_LIMIT.labels(name).set(self.limit)
+
+    def _shed(self, reason: str):
+        self.shed += 1
+        SHED_REQUESTS.labels(self.name, reason).inc()
+        raise HTTPException(status_code=503, detail="Server busy, please try again", headers={"Retry-After": "1"})
+
+    async def acquire(self) -> float:
+        """Takes a slot, waiting for one if needed; returns the seconds spent queued"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return 0.0
+        if len(self._waiters) >= int(self.limit):
+            self._shed("queue_full")
+
+        queued_at = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_target)
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the timeout fired
+            if waiter.done() and not waiter.cancelled():
+                return time.monotonic() - queued_at
+            self._remove(waiter)
+            self._shed("queue_timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._remove(waiter)
+            raise
+        return time.monotonic() - queued_at
+
+    def _remove(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def release(self, queue_delay: float):
+        saturated = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+
+        self.queue_delay += (queue_delay - self.queue_delay) * 0.1
+        if queue_delay > self.queue_target / 2:
+            self.limit = max(self.min_limit, self.limit * 0.95)
+        elif saturated:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+
+        self._wake()
+
+    async def __call__(self):
+        # Route dependency: holds a slot for the duration of the endpoint
+        queue_delay = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(queue_delay)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "shed": self.shed,
+            "queue_delay_seconds": self.queue_delay,
+        }
+
+
+password_throttle = PasswordThrottle(
+    per_ip=TokenBucketLimiter(PASSWORD_IP_PER_MINUTE, PASSWORD_IP_BURST, THROTTLE_MAX_KEYS),
+    per_email=TokenBucketLimiter(PASSWORD_EMAIL_PER_MINUTE, PASSWORD_EMAIL_BURST, THROTTLE_MAX_KEYS),
+    enabled=PASSWORD_THROTTLE_ENABLED,
+)
+
+password_limiter = AdaptiveConcurrencyLimiter(
+    "password", PASSWORD_CONCURRENCY, PASSWORD_CONCURRENCY * 4, LOAD_SHED_QUEUE_TARGET_MS / 1000
+)
+payment_limiter = AdaptiveConcurrencyLimiter(
+    "payment", PAYMENT_CONCURRENCY, PAYMENT_CONCURRENCY * 4, LOAD_SHED_QUEUE_TARGET_MS / 1000
+)
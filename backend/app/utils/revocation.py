@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+
+from config import REVOCATION_BLOOM_BITS, REVOCATION_BLOOM_HASHES, REVOCATION_POLL_INTERVAL
+from database import get_db
+from utils.metrics import BACKGROUND_ERRORS
+
+
+class BloomFilter:
+    def __init__(self, size_bits: int, hashes: int):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self.bits = bytearray((size_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return ((h1 + i * h2) % self.size_bits for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    """In-memory denylist of revoked invalidate_ids for stateless access-token checks.
+
+    The Bloom filter answers the common "not revoked" case without touching the
+    exact set; the exact set confirms positives. Entries only need to outlive the
+    access tokens they revoke, so both are rebuilt from the revoked_sessions
+    collection now and then to drop expired ids.
+    """
+
+    def __init__(self, bloom_bits: int, bloom_hashes: int, poll_interval: float, rebuild_interval: float = 3600):
+        self.bloom_bits = bloom_bits
+        self.bloom_hashes = bloom_hashes
+        self.poll_interval = poll_interval
+        self.rebuild_interval = rebuild_interval
+        self.bloom = BloomFilter(bloom_bits, bloom_hashes)
+        self.revoked = {}
+        self.last_seen = datetime.min
+
+    def _add(self, invalidate_id: str, expires_at: datetime, revoked_at: datetime):
+        self.bloom.add(invalidate_id)
+        self.revoked[invalidate_id] = expires_at
+        self.last_seen = max(self.last_seen, revoked_at)
+
+    def is_revoked(self, invalidate_id: str) -> bool:
+        return invalidate_id in self.bloom and invalidate_id in self.revoked
+
+    async def revoke(self, invalidate_id: str, expires_at: datetime):
+        now = datetime.utcnow()
+        db = get_db()
+        await db.revoked_sessions.update_one(
+            {"_id": invalidate_id},
+            {"$set": {"revoked_at": now, "expires_at": expires_at}},
+            upsert=True
+        )
+        self._add(invalidate_id, expires_at, now)
+
+    async def load(self):
+        now = datetime.utcnow()
+        self.bloom = BloomFilter(self.bloom_bits, self.bloom_hashes)
+        self.revoked = {}
+        db = get_db()
+        async for entry in db.revoked_sessions.find({"expires_at": {"$gt": now}}):
+            self._add(entry["_id"], entry["expires_at"], entry["revoked_at"])
+
+    async def poll(self):
+        # Overlap the window a little to tolerate clock skew between workers
+        since = self.last_seen - timedelta(seconds=5) if self.last_seen > datetime.min else self.last_seen
+        db = get_db()
+        async for entry in db.revoked_sessions.find({"revoked_at": {"$gte": since}}):
+            self._add(entry["_id"], entry["expires_at"], entry["revoked_at"])
+
+    async def run(self):
+        elapsed = 0.0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            elapsed += self.poll_interval
+            try:
+                if elapsed >= self.rebuild_interval:
+                    await self.load()
+                    elapsed = 0.0
+                else:
+                    await self.poll()
+            except Exception as e:
+                BACKGROUND_ERRORS.labels("revocation_list").inc()
+                print(f"Error refreshing revoked sessions: {e}")
+
+    def stats(self) -> dict:
+        return {"revoked": len(self.revoked), "bloom_bytes": len(self.bloom.bits)}
+
+
+revocation_list = RevocationList(
+    bloom_bits=REVOCATION_BLOOM_BITS,
+    bloom_hashes=REVOCATION_BLOOM_HASHES,
+    poll_interval=REVOCATION_POLL_INTERVAL,
+)
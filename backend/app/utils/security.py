@@ -1,33 +1,76 @@
+import asyncio
+import hmac
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import jwt
 from bson import ObjectId
-from config import JWT_ALGORITHM, JWT_SECRET
+from config import (
+    ADMIN_EMAILS,
+    AUTH_STATELESS,
+    JWT_ALGORITHM,
+    JWT_SECRET,
+    METRICS_TOKEN,
+    PASSWORD_HASH_MAX_QUEUE,
+    PASSWORD_HASH_WORKERS,
+    SESSION_CACHE_SIZE,
+    SESSION_CACHE_TTL,
+)
 from database import get_db
 from fastapi import Depends, HTTPException, Request
 from fastapi.responses import Response
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from models.user import UserResponse
 from passlib.context import CryptContext
+from utils.cache import TTLCache
+from utils.profiler import sampling_profiler
+from utils.revocation import revocation_list
+from utils.session_activity import session_activity
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+ACCESS_TOKEN_LIFETIME = timedelta(hours=1)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Sessions validated within the last SESSION_CACHE_TTL seconds, keyed by invalidate_id.
+# A session revoked from another worker keeps working here for at most that long.
+session_cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
 
+# bcrypt releases the GIL, so a thread pool keeps hashing off the event loop
+# without the pickling overhead of a process pool.
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+pending_password_jobs = 0
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
 
+async def run_password_job(func, *args):
+    global pending_password_jobs
+    if pending_password_jobs >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(status_code=503, detail="Server busy, please try again")
 
-def create_session_tokens(user_id: str, email: str) -> tuple[str, str]:
+    pending_password_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        # Tagged with the calling task so a profile of the request includes the hashing itself
+        return await loop.run_in_executor(
+            password_executor, sampling_profiler.run_for, asyncio.current_task(), func, *args
+        )
+    finally:
+        pending_password_jobs -= 1
+
+
+async def verify_password(plain_password, hashed_password):
+    return await run_password_job(pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash(password):
+    return await run_password_job(pwd_context.hash, password)
+
+
+async def create_session_tokens(user_id: str, email: str) -> tuple[str, str]:
     invalidate_id = str(uuid.uuid4())
     db = get_db()
 
-    access_expires = datetime.utcnow() + timedelta(hours=1)
+    access_expires = datetime.utcnow() + ACCESS_TOKEN_LIFETIME
     access_token = jwt.encode(
         {
             "user_id": str(user_id),
@@ -52,7 +95,7 @@ def create_session_tokens(user_id: str, email: str) -> tuple[str, str]:
         algorithm=JWT_ALGORITHM
     )
 
-    db.sessions.insert_one({
+    await db.sessions.insert_one({
         "invalidate_id": invalidate_id,
         "user_id": ObjectId(user_id),
         "created_at": datetime.utcnow(),
@@ -63,22 +106,26 @@ def create_session_tokens(user_id: str, email: str) -> tuple[str, str]:
     return access_token, refresh_token
 
 
-def verify_token(token: str, token_type: str = "access"):
+async def verify_token(token: str, token_type: str = "access"):
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
 
         if payload.get("type") != token_type:
             raise HTTPException(status_code=401, detail="Invalid token type")
 
-        db = get_db()
-        session = db.sessions.find_one({"invalidate_id": payload.get("invalidate_id")})
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid session")
+        invalidate_id = payload.get("invalidate_id")
+        if AUTH_STATELESS and token_type == "access":
+            # Signature and expiry are enough; only revoked sessions need a lookup
+            if revocation_list.is_revoked(invalidate_id):
+                raise HTTPException(status_code=401, detail="Invalid session")
+        elif session_cache.get(invalidate_id) is None:
+            db = get_db()
+            session = await db.sessions.find_one({"invalidate_id": invalidate_id})
+            if not session:
+                raise HTTPException(status_code=401, detail="Invalid session")
+            session_cache.set(invalidate_id, session)
 
-        db.sessions.update_one(
-            {"invalidate_id": payload.get("invalidate_id")},
-            {"$set": {"last_used": datetime.utcnow()}}
-        )
+        session_activity.touch(invalidate_id)
 
         return payload
     except jwt.ExpiredSignatureError:
@@ -87,9 +134,13 @@ def verify_token(token: str, token_type: str = "access"):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def invalidate_session(invalidate_id: str):
+async def invalidate_session(invalidate_id: str):
     db = get_db()
-    db.sessions.delete_one({"invalidate_id": invalidate_id})
+    await db.sessions.delete_one({"invalidate_id": invalidate_id})
+    session_cache.pop(invalidate_id)
+    if AUTH_STATELESS:
+        # Access tokens issued for this session stay valid by signature until they expire
+        await revocation_list.revoke(invalidate_id, datetime.utcnow() + ACCESS_TOKEN_LIFETIME)
 
 
 def set_auth_cookies(response: Response, access_token: str, refresh_token: str):
@@ -121,26 +172,43 @@ async def get_current_user(request: Request):
     if not access_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    payload = verify_token(access_token, "access")
+    payload = await verify_token(access_token, "access")
     return payload.get("sub")
 
 
-def create_user_response(user: dict) -> dict:
-    user_response = UserResponse(
-        email=user["email"],
-        username=user["username"],
-        id=str(user["_id"]),
-        credits=user.get("credits", 0),
-        email_verified=user.get("email_verified", False),
-        created_at=user.get("created_at", datetime.utcnow()),
-        terms_accepted=user.get("terms_accepted", False),
-    )
+async def get_admin_user(current_user: str = Depends(get_current_user)):
+    if current_user.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+
+def require_metrics_access(request: Request):
+    """Scrapers send METRICS_TOKEN as a bearer token; without one configured, only local clients may scrape"""
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Metrics are only served to local clients")
+
+
+async def create_user_response(user: dict) -> dict:
+    # Same fields as models.user.UserResponse; the routes' response_model validates and
+    # serializes it in one pass.
+    user_response = {
+        "email": user["email"],
+        "username": user["username"],
+        "id": str(user["_id"]),
+        "credits": float(user.get("credits", 0)),
+        "email_verified": user.get("email_verified", False),
+        "created_at": user.get("created_at", datetime.utcnow()),
+        "terms_accepted": user.get("terms_accepted", False),
+    }
 
-    access_token, refresh_token = create_session_tokens(str(user["_id"]), user["email"])
+    access_token, refresh_token = await create_session_tokens(str(user["_id"]), user["email"])
 
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
         "token_type": "bearer",
-        "data": user_response.dict(),
+        "data": user_response,
     }
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime
+
+from config import SESSION_ACTIVITY_FLUSH_INTERVAL, SESSION_ACTIVITY_MAX_PENDING
+from database import get_db
+from pymongo import UpdateOne
+from utils.metrics import BACKGROUND_ERRORS
+
+
+class SessionActivityBuffer:
+    """Coalesces session last_used touches in memory and writes them in batches"""
+
+    def __init__(self, flush_interval: float, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.touches = 0
+        self.writes = 0
+        self._pending = {}
+        self._flush_task = None
+
+    def touch(self, invalidate_id: str):
+        self._pending[invalidate_id] = datetime.utcnow()
+        self.touches += 1
+
+        if len(self._pending) >= self.max_pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        operations = [
+            UpdateOne({"invalidate_id": invalidate_id}, {"$max": {"last_used": last_used}})
+            for invalidate_id, last_used in pending.items()
+        ]
+
+        try:
+            db = get_db()
+            await db.sessions.bulk_write(operations, ordered=False)
+        except Exception:
+            # Put the batch back so the next flush retries it, keeping newer touches
+            for invalidate_id, last_used in pending.items():
+                self._pending.setdefault(invalidate_id, last_used)
+            raise
+
+        self.writes += 1
+        return len(operations)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                BACKGROUND_ERRORS.labels("session_activity").inc()
+                print(f"Error flushing session activity: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "touches": self.touches,
+            "writes": self.writes,
+        }
+
+
+session_activity = SessionActivityBuffer(
+    flush_interval=SESSION_ACTIVITY_FLUSH_INTERVAL,
+    max_pending=SESSION_ACTIVITY_MAX_PENDING,
+)
@@ -0,0 +1,80 @@
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from database import get_db
+from utils.cache import TTLCache
+
+# Password hashes stay out of the cache; login and change-password read them from the database.
+# credited_payments only guards grant_payment_credits and grows with every payment.
+USER_PROJECTION = {"password": False, "credited_payments": False}
+
+
+class UserCache:
+    """Read-through cache of user documents, keyed by email with an _id -> email index.
+
+    Every write to the users collection must call invalidate() with the user's
+    email, so a worker never serves a stale document after its own write. Writes
+    made by other workers become visible within `ttl` seconds.
+
+    invalidate() also bumps a generation counter, and a read-through miss only
+    caches its result if no invalidation happened while it was reading; otherwise
+    a read that raced a write could put the old document back. Misses by email
+    track the generation of that email, misses by _id (whose email isn't known
+    yet) the generation of the whole cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._users = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._emails = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generation = 0
+        # email -> [reads in flight, generation]; only held while a read is in flight
+        self._reads = {}
+
+    async def get_by_email(self, email: str):
+        user = self._users.get(email)
+        if user is None:
+            reads = self._reads.setdefault(email, [0, 0])
+            reads[0] += 1
+            generation = reads[1]
+            try:
+                db = get_db()
+                user = await db.users.find_one({"email": email}, projection=USER_PROJECTION)
+            finally:
+                reads[0] -= 1
+                if not reads[0]:
+                    del self._reads[email]
+            if user and reads[1] == generation:
+                self.set(user)
+        return user
+
+    async def get_by_id(self, user_id):
+        email = self._emails.get(str(user_id))
+        user = self._users.get(email) if email else None
+        if user is None:
+            generation = self._generation
+            db = get_db()
+            user = await db.users.find_one({"_id": user_id}, projection=USER_PROJECTION)
+            if user and self._generation == generation:
+                self.set(user)
+        return user
+
+    def set(self, user: dict):
+        self._users.set(user["email"], user)
+        self._emails.set(str(user["_id"]), user["email"])
+
+    def invalidate(self, email: str):
+        self._users.pop(email)
+        self._generation += 1
+        if email in self._reads:
+            self._reads[email][1] += 1
+
+    def clear(self):
+        self._users.clear()
+        self._emails.clear()
+        self._generation += 1
+        for reads in self._reads.values():
+            reads[1] += 1
+
+    def stats(self) -> dict:
+        return self._users.stats()
+
+
+user_cache = UserCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
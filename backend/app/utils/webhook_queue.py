@@ -0,0 +1,171 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from config import WEBHOOK_LEASE_SECONDS, WEBHOOK_MAX_ATTEMPTS, WEBHOOK_POLL_INTERVAL, WEBHOOK_WORKERS
+from database import get_db
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from utils.credit_operations import grant_payment_credits, payment_id_filter
+from utils.mercadopago_gateway import mercadopago_gateway
+from utils.metrics import BACKGROUND_ERRORS
+
+
+class WebhookQueue:
+    """Payment notifications persisted to webhook_events and processed in the background.
+
+    Events are keyed by their Mercado Pago event id, so redeliveries are dropped
+    on insert; a notification without one gets a key of its own, since a later
+    update of the same payment can look exactly like an earlier one. Processing one event also settles every other event for the same
+    payment that arrived before it was claimed.
+    """
+
+    def __init__(self, workers: int, poll_interval: float, lease: float, max_attempts: int):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.received = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self._wakeup = None
+
+    async def enqueue(self, data: dict):
+        resource = data.get("data")
+        if data.get("type") != "payment" or not isinstance(resource, dict) or not resource.get("id"):
+            return
+
+        payment_id = str(resource["id"])
+        now = datetime.utcnow()
+        db = get_db()
+        try:
+            await db.webhook_events.insert_one({
+                "_id": str(data.get("id") or f"{payment_id}:{data.get('action')}:{uuid.uuid4().hex}"),
+                "payment_id": payment_id,
+                "payload": data,
+                "status": "pending",
+                "attempts": 0,
+                "received_at": now,
+                "not_before": now,
+            })
+        except DuplicateKeyError:
+            self.duplicates += 1
+            return
+
+        self.received += 1
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        db = get_db()
+        return await db.webhook_events.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "not_before": {"$lte": now}},
+                {"status": "processing", "locked_until": {"$lte": now}},
+            ]},
+            {"$set": {
+                "status": "processing",
+                "claimed_at": now,
+                "locked_until": now + timedelta(seconds=self.lease),
+            }},
+            sort=[("received_at", ASCENDING)]
+        )
+
+    async def _process(self, event: dict):
+        payment_id = event["payment_id"]
+        payment_info = await mercadopago_gateway.get_payment(payment_id)
+        if payment_info["status"] != 200:
+            raise RuntimeError(f"Payment lookup failed with status {payment_info['status']}")
+
+        payment = payment_info["response"]
+        db = get_db()
+        if payment["status"] == "approved":
+            await grant_payment_credits(payment_id, float(payment["transaction_amount"]))
+        else:
+            await db.payments.update_one(
+                {"payment_id": payment_id_filter(payment_id), "credits_added": False},
+                {"$set": {"status": payment["status"]}}
+            )
+
+    async def _handle(self, event: dict):
+        db = get_db()
+        try:
+            await self._process(event)
+        except Exception as e:
+            self.failed += 1
+            attempts = event.get("attempts", 0) + 1
+            await db.webhook_events.update_one(
+                {"_id": event["_id"]},
+                {
+                    "$set": {
+                        "status": "pending" if attempts < self.max_attempts else "failed",
+                        "attempts": attempts,
+                        "not_before": datetime.utcnow() + timedelta(seconds=min(5 * 2 ** attempts, 3600)),
+                        "last_error": str(e),
+                    },
+                    "$unset": {"locked_until": ""},
+                }
+            )
+            BACKGROUND_ERRORS.labels("webhook_event").inc()
+            print(f"Error processing webhook event {event['_id']}: {e}")
+            return
+
+        now = datetime.utcnow()
+        await db.webhook_events.update_one(
+            {"_id": event["_id"]},
+            {"$set": {"status": "done", "processed_at": now}, "$unset": {"locked_until": ""}}
+        )
+        # The payment status fetched above already covers earlier events for this payment
+        await db.webhook_events.update_many(
+            {"payment_id": event["payment_id"], "status": "pending", "received_at": {"$lte": event["claimed_at"]}},
+            {"$set": {"status": "done", "processed_at": now, "superseded_by": event["_id"]}}
+        )
+        self.processed += 1
+        self.last_lag = (now - event["received_at"]).total_seconds()
+
+    async def _worker(self):
+        while True:
+            try:
+                event = await self._claim()
+                if not event:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._handle(event)
+            except Exception as e:
+                BACKGROUND_ERRORS.labels("webhook_queue").inc()
+                print(f"Error processing webhook queue: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+
+    async def stats(self) -> dict:
+        db = get_db()
+        oldest = await db.webhook_events.find_one(
+            {"status": "pending"}, projection={"received_at": True}, sort=[("received_at", ASCENDING)]
+        )
+        return {
+            "depth": await db.webhook_events.count_documents({"status": "pending"}),
+            "lag_seconds": (datetime.utcnow() - oldest["received_at"]).total_seconds() if oldest else 0.0,
+            "last_processing_lag_seconds": self.last_lag,
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+
+webhook_queue = WebhookQueue(
+    workers=WEBHOOK_WORKERS,
+    poll_interval=WEBHOOK_POLL_INTERVAL,
+    lease=WEBHOOK_LEASE_SECONDS,
+    max_attempts=WEBHOOK_MAX_ATTEMPTS,
+)
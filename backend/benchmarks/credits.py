@@ -0,0 +1,88 @@
+"""Credit deduction throughput and overdraft under contention, against a local mongod.
+
+Compares the old deduction (find_one, then an unconditional $inc) with the
+conditional find_one_and_update check_and_deduct_credits uses now. Every
+worker charges the same user, so concurrent requests race for one balance.
+
+    cd backend
+    python -m benchmarks.credits --concurrency 1 16 64 --deductions 5000
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+EMAIL = "hot-user@benchmark.local"
+
+
+async def two_round_trips(users, amount: float) -> bool:
+    user = await users.find_one({"email": EMAIL}, projection={"credits": True})
+    if user["credits"] < amount:
+        return False
+    await users.update_one({"email": EMAIL}, {"$inc": {"credits": -amount}})
+    return True
+
+
+async def conditional_update(users, amount: float) -> bool:
+    user = await users.find_one_and_update(
+        {"email": EMAIL, "credits": {"$gte": amount}},
+        {"$inc": {"credits": -amount}},
+        projection={"credits": True},
+        return_document=ReturnDocument.AFTER
+    )
+    return user is not None
+
+
+async def drive(users, deduct, concurrency: int, deductions: int, amount: float) -> dict:
+    # The balance covers exactly half the attempts, so the last ones must be refused
+    await users.replace_one({"email": EMAIL}, {"email": EMAIL, "credits": deductions * amount / 2}, upsert=True)
+    remaining = iter(range(deductions))
+    charged = 0
+
+    async def worker():
+        nonlocal charged
+        for _ in remaining:
+            if await deduct(users, amount):
+                charged += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    balance = (await users.find_one({"email": EMAIL}))["credits"]
+    return {"throughput": deductions / elapsed, "charged": charged, "balance": balance}
+
+
+async def benchmark(args):
+    client = AsyncIOMotorClient(args.mongodb_url)
+    database = f"benchmark_credits_{uuid.uuid4().hex[:8]}"
+    users = client[database].users
+    try:
+        print(f"{'implementation':<20} {'conc':>5} {'rps':>9} {'charged':>8} {'balance':>9}")
+        for concurrency in args.concurrency:
+            for name, deduct in (("two_round_trips", two_round_trips), ("conditional_update", conditional_update)):
+                row = await drive(users, deduct, concurrency, args.deductions, args.amount)
+                print(
+                    f"{name:<20} {concurrency:>5} {row['throughput']:>9.1f} {row['charged']:>8} {row['balance']:>9.2f}"
+                )
+    finally:
+        await client.drop_database(database)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-url", default=os.getenv("BENCHMARK_MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 16, 64])
+    parser.add_argument("--deductions", type=int, default=5000, help="Deductions attempted per run")
+    parser.add_argument("--amount", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Local stand-ins for Mercado Pago, Facebook and Google OAuth and SMTP used by the benchmarks.
+
+Run with: python -m benchmarks.fakes --port 9100 --smtp-port 9125
+"""
+import argparse
+import asyncio
+import itertools
+import uuid
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+payments = {}
+payment_ids = itertools.count(1_000_000)
+latency = 0.0
+
+PAYMENT_METHODS = [
+    {
+        "id": "visa",
+        "payment_type_id": "credit_card",
+        "settings": [{"bin": {"pattern": "^4", "exclusion_pattern": None}}],
+    },
+    {
+        "id": "master",
+        "payment_type_id": "credit_card",
+        "settings": [{"bin": {"pattern": "^(5[1-5]|(2(2(2[1-9]|[3-9])|[3-6]|7([0-1]|20))))", "exclusion_pattern": None}}],
+    },
+    {"id": "pix", "payment_type_id": "bank_transfer", "settings": []},
+]
+
+
+@app.middleware("http")
+async def gateway_latency(request: Request, call_next):
+    if latency:
+        await asyncio.sleep(latency)
+    return await call_next(request)
+
+
+@app.get("/mp/v1/payment_methods")
+async def list_payment_methods():
+    return PAYMENT_METHODS
+
+
+@app.post("/mp/v1/card_tokens", status_code=201)
+async def create_card_token(card: dict):
+    return {"id": uuid.uuid4().hex}
+
+
+@app.post("/mp/v1/payments", status_code=201)
+async def create_payment(data: dict):
+    payment_id = next(payment_ids)
+    payment = {
+        "id": payment_id,
+        "status": "approved" if data.get("token") else "pending",
+        "transaction_amount": data["transaction_amount"],
+        "description": data.get("description"),
+        "payment_method_id": data.get("payment_method_id"),
+        "date_created": datetime.utcnow().isoformat(),
+        "point_of_interaction": {
+            "transaction_data": {
+                "qr_code": f"qr-{payment_id}",
+                "qr_code_base64": "",
+                "ticket_url": f"https://example.invalid/ticket/{payment_id}",
+            }
+        },
+    }
+    payments[payment_id] = payment
+    return payment
+
+
+@app.get("/mp/v1/payments/search")
+async def search_payments(begin_date: str, end_date: str, limit: int = 30, offset: int = 0):
+    begin = datetime.fromisoformat(begin_date.rstrip("Z"))
+    end = datetime.fromisoformat(end_date.rstrip("Z"))
+    matches = [
+        payment for payment in payments.values()
+        if begin <= datetime.fromisoformat(payment["date_created"]) <= end
+    ]
+    return {
+        "paging": {"total": len(matches), "limit": limit, "offset": offset},
+        "results": matches[offset:offset + limit],
+    }
+
+
+@app.get("/mp/v1/payments/{payment_id}")
+async def get_payment(payment_id: int):
+    if payment_id not in payments:
+        return JSONResponse({"message": "Payment not found"}, status_code=404)
+    return payments[payment_id]
+
+
+@app.post("/mp/v1/payments/{payment_id}/approve")
+async def approve_payment(payment_id: int):
+    """Benchmark helper: flip a pending payment to approved, as a PIX transfer would"""
+    payments[payment_id]["status"] = "approved"
+    return payments[payment_id]
+
+
+@app.get("/fb/v12.0/oauth/access_token")
+async def facebook_token(code: str):
+    return {"access_token": code, "token_type": "bearer"}
+
+
+@app.get("/fb/me")
+async def facebook_me(access_token: str):
+    return {"id": access_token, "name": f"Bench {access_token}", "email": f"{access_token}@facebook.bench"}
+
+
+@app.post("/google/token")
+async def google_token(request: Request):
+    # Form-encoded like the real endpoint; parsed by hand so the fakes don't need python-multipart
+    form = parse_qs((await request.body()).decode())
+    code = form["code"][0]
+    return {"access_token": code, "id_token": f"id-token-{code}", "token_type": "Bearer"}
+
+
+class DiscardHandler:
+    async def handle_DATA(self, server, session, envelope):
+        return "250 Message accepted"
+
+
+def main():
+    global latency
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--smtp-port", type=int, default=9125)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every upstream HTTP call")
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    from aiosmtpd.controller import Controller
+    smtp = Controller(DiscardHandler(), hostname=args.host, port=args.smtp_port)
+    smtp.start()
+    try:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    finally:
+        smtp.stop()
+
+
+if __name__ == "__main__":
+    main()
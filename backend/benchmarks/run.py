@@ -0,0 +1,435 @@
+"""Load and latency benchmarks for the API.
+
+Starts the fake upstreams (benchmarks/fakes.py) and the app against a local
+mongod, seeds users through the API, then drives each scenario at fixed
+concurrency levels and reports throughput and p50/p95/p99 per endpoint.
+
+    cd backend
+    python -m benchmarks.run --concurrency 1 16 64 --duration 10 --output results.json
+    python -m benchmarks.run --concurrency 1 16 64 --duration 10 --baseline results.json
+
+The first run saves a baseline on this machine; later runs exit with status 1
+when a result regresses past --tolerance against it.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+
+import httpx
+import jwt
+from pymongo import MongoClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(BACKEND_DIR, "app")
+JWT_SECRET = "benchmark-secret"
+PASSWORD = "benchmark-password"
+# Seeding runs a few users at a time so the password limiter doesn't shed it
+SEED_CONCURRENCY = 4
+
+# name -> weight in the "mix" scenario
+MIX = {
+    "protected": 30,
+    "credit_based": 20,
+    "paid_route": 15,
+    "payment_history": 15,
+    "refresh": 10,
+    "login": 5,
+    "webhook": 4,
+    "register": 1,
+}
+
+# Mostly bcrypt-bound logins; p99 of the protected route shows whether hashing stalls the event loop
+LOGIN_BURST = {
+    "login": 70,
+    "protected": 30,
+}
+
+MIXES = {"mix": MIX, "login_burst": LOGIN_BURST}
+
+
+class BenchUser:
+    def __init__(self, email: str):
+        self.email = email
+        self.access_token = None
+        self.refresh_token = None
+        self.pix_payment_ids = []
+
+    def cookies(self) -> dict:
+        return {"Cookie": f"access_token={self.access_token}; refresh_token={self.refresh_token}"}
+
+    def update_cookies(self, response: httpx.Response):
+        # The app sets Secure cookies, which an HTTP client won't send back on its own
+        for header in response.headers.get_list("set-cookie"):
+            cookie = SimpleCookie(header)
+            if "access_token" in cookie:
+                self.access_token = cookie["access_token"].value
+            if "refresh_token" in cookie:
+                self.refresh_token = cookie["refresh_token"].value
+
+
+class Stack:
+    """The fake upstreams and the app under test, each in its own process"""
+
+    def __init__(self, args):
+        self.args = args
+        self.database = f"benchmark_{uuid.uuid4().hex[:8]}"
+        self.processes = []
+
+    def app_env(self) -> dict:
+        fakes = f"http://127.0.0.1:{self.args.fakes_port}"
+        env = dict(os.environ)
+        env.update({
+            "MONGODB_URL": self.args.mongodb_url,
+            "SOFTWARE_NAME": self.database,
+            "COMPANY_NAME": "Benchmark",
+            "JWT_SECRET": JWT_SECRET,
+            "BASE_URL": f"http://127.0.0.1:{self.args.port}",
+            "CREDIT_VALUE": "1.0",
+            "MERCADO_PAGO_ACCESS_TOKEN": "benchmark",
+            "MERCADO_PAGO_API_URL": f"{fakes}/mp",
+            "FACEBOOK_CLIENT_ID": "benchmark",
+            "FACEBOOK_CLIENT_SECRET": "benchmark",
+            "FACEBOOK_GRAPH_URL": f"{fakes}/fb",
+            "GOOGLE_TOKEN_URL": f"{fakes}/google/token",
+            "SMTP_SERVER": "127.0.0.1",
+            "SMTP_PORT": str(self.args.smtp_port),
+            "SMTP_STARTTLS": "false",
+            "SMTP_USERNAME": "",
+            "EMAIL_FROM": "benchmark@localhost",
+            # Every simulated client comes from 127.0.0.1 and seeding alone logs in ~100 users
+            "PASSWORD_THROTTLE_ENABLED": "false",
+        })
+        env.update(self.args.app_env)
+        return env
+
+    async def start(self):
+        self.processes.append(subprocess.Popen(
+            [
+                sys.executable, "-m", "benchmarks.fakes",
+                "--port", str(self.args.fakes_port),
+                "--smtp-port", str(self.args.smtp_port),
+                "--latency-ms", str(self.args.gateway_latency_ms),
+            ],
+            cwd=BACKEND_DIR,
+        ))
+        await wait_ready(f"http://127.0.0.1:{self.args.fakes_port}/mp/v1/payment_methods")
+
+        self.processes.append(subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "main:app",
+                "--port", str(self.args.port), "--log-level", "warning",
+            ],
+            cwd=APP_DIR,
+            env=self.app_env(),
+        ))
+        await wait_ready(f"http://127.0.0.1:{self.args.port}/openapi.json")
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if not self.args.keep_database:
+            MongoClient(self.args.mongodb_url).drop_database(self.database)
+
+
+async def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+class Context:
+    def __init__(self, client: httpx.AsyncClient, users: list, fakes_url: str):
+        self.client = client
+        self.users = users
+        self.fakes_url = fakes_url
+        self.emails = itertools.count()
+        self.run_id = uuid.uuid4().hex[:8]
+
+    def user(self) -> BenchUser:
+        return random.choice(self.users)
+
+
+async def register_user(ctx: Context, email: str) -> httpx.Response:
+    return await ctx.client.post("/auth/register", json={"email": email, "username": email.split("@")[0], "password": PASSWORD})
+
+
+async def seed_user(ctx: Context, index: int) -> BenchUser:
+    user = BenchUser(f"seed-{ctx.run_id}-{index}@benchmark.local")
+    (await register_user(ctx, user.email)).raise_for_status()
+
+    token = jwt.encode(
+        {"email": user.email, "exp": datetime.utcnow() + timedelta(hours=1)}, JWT_SECRET, algorithm="HS256"
+    )
+    (await ctx.client.get("/auth/verify-email", params={"token": token})).raise_for_status()
+
+    response = await ctx.client.post("/auth/login", json={"email": user.email, "password": PASSWORD})
+    response.raise_for_status()
+    user.update_cookies(response)
+
+    # An approved card payment grants credits and makes the user "paid"
+    (await ctx.client.post("/payment/create_payment", headers=user.cookies(), json={
+        "payment": {"amount": "1000.00", "description": "Benchmark credits", "payment_method": "credit_card"},
+        "card": {
+            "card_number": "4111111111111111",
+            "expiration_month": 12,
+            "expiration_year": 2030,
+            "security_code": "123",
+            "cardholder_name": "Benchmark",
+        },
+    })).raise_for_status()
+
+    for _ in range(3):
+        await ctx.client.post("/payment/create_pix_payment", headers=user.cookies(), json={
+            "amount": "10.00", "description": "Benchmark PIX"
+        })
+    payments = await ctx.client.get("/payment/payments", headers=user.cookies(), params={"size": 100})
+    user.pix_payment_ids = [
+        item["id"] for item in payments.json()["items"] if item["payment_method"] == "pix"
+    ]
+    # One settled transfer per user, so webhook bursts also exercise the credit grant
+    if user.pix_payment_ids:
+        await ctx.client.post(f"{ctx.fakes_url}/mp/v1/payments/{user.pix_payment_ids[0]}/approve")
+    return user
+
+
+async def scenario_register(ctx: Context):
+    return await register_user(ctx, f"new-{ctx.run_id}-{next(ctx.emails)}@benchmark.local")
+
+
+async def scenario_login(ctx: Context):
+    return await ctx.client.post("/auth/login", json={"email": ctx.user().email, "password": PASSWORD})
+
+
+async def scenario_refresh(ctx: Context):
+    user = ctx.user()
+    response = await ctx.client.post("/auth/refresh", headers=user.cookies())
+    user.update_cookies(response)
+    return response
+
+
+async def scenario_protected(ctx: Context):
+    return await ctx.client.get("/test/example-protected-route", headers=ctx.user().cookies())
+
+
+async def scenario_credit_based(ctx: Context):
+    return await ctx.client.get("/test/credit-based-route", headers=ctx.user().cookies(), params={"credits_required": 0.01})
+
+
+async def scenario_credit_contention(ctx: Context):
+    # Every request charges the same user, so the deductions race for one balance
+    return await ctx.client.get("/test/credit-based-route", headers=ctx.users[0].cookies(), params={"credits_required": 0.01})
+
+
+async def scenario_paid_route(ctx: Context):
+    return await ctx.client.get("/test/example-paid-route", headers=ctx.user().cookies(), params={"days": 30})
+
+
+async def scenario_payment_history(ctx: Context):
+    return await ctx.client.get("/payment/payments", headers=ctx.user().cookies(), params={"size": 10, "include_total": "false"})
+
+
+async def scenario_webhook(ctx: Context):
+    user = ctx.user()
+    payment_id = random.choice(user.pix_payment_ids) if user.pix_payment_ids else "0"
+    return await ctx.client.post("/payment/webhook", json={
+        "id": uuid.uuid4().hex,
+        "type": "payment",
+        "action": "payment.updated",
+        "data": {"id": payment_id},
+    })
+
+
+SCENARIOS = {
+    "register": scenario_register,
+    "login": scenario_login,
+    "refresh": scenario_refresh,
+    "protected": scenario_protected,
+    "credit_based": scenario_credit_based,
+    "credit_contention": scenario_credit_contention,
+    "paid_route": scenario_paid_route,
+    "payment_history": scenario_payment_history,
+    "webhook": scenario_webhook,
+}
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def drive(ctx: Context, name: str, concurrency: int, duration: float) -> list:
+    """Run one scenario (or a weighted mix) and return a result row per endpoint"""
+    mix = MIXES.get(name)
+    names = list(mix) if mix else [name]
+    weights = list(mix.values()) if mix else None
+    latencies = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            scenario = random.choices(names, weights)[0] if weights else names[0]
+            started = time.perf_counter()
+            try:
+                response = await SCENARIOS[scenario](ctx)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies[scenario].append(time.perf_counter() - started)
+            else:
+                errors[scenario] += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    rows = []
+    for scenario in names:
+        values = sorted(latencies[scenario])
+        rows.append({
+            "scenario": name,
+            "endpoint": scenario,
+            "concurrency": concurrency,
+            "requests": len(values),
+            "errors": errors[scenario],
+            "throughput": len(values) / elapsed,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        })
+    return rows
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Return a description of every row that regressed past `tolerance` against the baseline"""
+    previous = {(row["scenario"], row["endpoint"], row["concurrency"]): row for row in baseline}
+    regressions = []
+    for row in results:
+        before = previous.get((row["scenario"], row["endpoint"], row["concurrency"]))
+        if not before:
+            continue
+        label = f"{row['scenario']}/{row['endpoint']} @ {row['concurrency']}"
+        if before["p99_ms"] and row["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p99 {before['p99_ms']:.1f}ms -> {row['p99_ms']:.1f}ms")
+        if before["throughput"] and row["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {before['throughput']:.1f}/s -> {row['throughput']:.1f}/s")
+    return regressions
+
+
+def print_table(results: list):
+    print(f"{'scenario':<16} {'endpoint':<16} {'conc':>5} {'req':>7} {'err':>5} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for row in results:
+        print(
+            f"{row['scenario']:<16} {row['endpoint']:<16} {row['concurrency']:>5} {row['requests']:>7} "
+            f"{row['errors']:>5} {row['throughput']:>9.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+        )
+
+
+async def benchmark(args) -> dict:
+    stack = Stack(args)
+    await stack.start()
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=30) as client:
+            ctx = Context(client, [], f"http://127.0.0.1:{args.fakes_port}")
+            seeding = asyncio.Semaphore(SEED_CONCURRENCY)
+
+            async def seed(index: int) -> BenchUser:
+                async with seeding:
+                    return await seed_user(ctx, index)
+
+            ctx.users = await asyncio.gather(*(seed(i) for i in range(args.users)))
+
+            results = []
+            for name in args.scenarios:
+                for concurrency in args.concurrency:
+                    rows = await drive(ctx, name, concurrency, args.duration)
+                    results.extend(rows)
+                    print_table(rows)
+    finally:
+        stack.stop()
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "duration": args.duration,
+            "users": args.users,
+            "gateway_latency_ms": args.gateway_latency_ms,
+            "app_env": args.app_env,
+        },
+        "results": results,
+    }
+
+
+def env_setting(value: str) -> tuple:
+    name, separator, setting = value.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {value!r}")
+    return name, setting
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and latency benchmarks for the API")
+    parser.add_argument("--mongodb-url", default=os.getenv("BENCHMARK_MONGODB_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--fakes-port", type=int, default=9100)
+    parser.add_argument("--smtp-port", type=int, default=9125)
+    parser.add_argument("--scenarios", nargs="+", default=[*SCENARIOS, *MIXES], choices=[*SCENARIOS, *MIXES])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 16, 64])
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario and concurrency level")
+    parser.add_argument("--users", type=int, default=50, help="Seeded users the scenarios pick from")
+    parser.add_argument("--gateway-latency-ms", type=float, default=0)
+    parser.add_argument(
+        "--app-env", nargs="+", type=env_setting, default=[], metavar="NAME=VALUE",
+        help="Extra settings for the app, e.g. SESSION_CACHE_TTL=0 to measure without the session cache",
+    )
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved by a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression, default 20%%")
+    parser.add_argument("--keep-database", action="store_true")
+    args = parser.parse_args()
+    args.app_env = dict(args.app_env)
+
+    report = asyncio.run(benchmark(args))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report["results"], json.load(file)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Microbenchmarks of response serialization cost per endpoint payload.
+
+Compares FastAPI's legacy path (pydantic model -> jsonable_encoder -> json.dumps)
+with the one routes with a response_model use now, where pydantic validates the
+payload and dumps it straight to JSON bytes.
+
+    cd backend
+    python -m benchmarks.serialization --number 2000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from models.payment import PaginatedPaymentResponse  # noqa: E402
+from models.user import TokenResponse  # noqa: E402
+
+
+def user_payload() -> dict:
+    return {
+        "access_token": "a" * 200,
+        "refresh_token": "r" * 200,
+        "token_type": "bearer",
+        "data": {
+            "email": "user@example.com",
+            "username": "user",
+            "id": str(ObjectId()),
+            "credits": 42.5,
+            "email_verified": True,
+            "created_at": datetime.utcnow(),
+            "terms_accepted": True,
+        },
+    }
+
+
+def payments_payload(size: int) -> dict:
+    return {
+        "items": [
+            {
+                "id": str(1_000_000 + i),
+                "status": "approved",
+                "amount": 10.0,
+                "description": "Credits",
+                "payment_method": "pix",
+            } for i in range(size)
+        ],
+        "total": None,
+        "page": None,
+        "size": size,
+        "pages": None,
+        "next_cursor": "eyJkIjogIjIwMjQtMDEtMDFUMDA6MDA6MDAiLCAiaSI6ICIwIn0=",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    cases = {
+        "auth/login": (TokenResponse, user_payload()),
+        "payment/payments (10)": (PaginatedPaymentResponse, payments_payload(10)),
+        "payment/payments (100)": (PaginatedPaymentResponse, payments_payload(100)),
+    }
+
+    print(f"{'payload':<24} {'legacy (us)':>12} {'pydantic (us)':>14} {'speedup':>8}")
+    for name, (model, payload) in cases.items():
+        adapter = TypeAdapter(model)
+        legacy = timeit.timeit(
+            lambda: json.dumps(jsonable_encoder(model(**payload))).encode(), number=args.number
+        ) / args.number * 1e6
+        fast = timeit.timeit(
+            lambda: adapter.dump_json(adapter.validate_python(payload)), number=args.number
+        ) / args.number * 1e6
+        print(f"{name:<24} {legacy:>12.1f} {fast:>14.1f} {legacy / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
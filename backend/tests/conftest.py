@@ -0,0 +1,67 @@
+"""Shared fixtures. Tests that touch MongoDB run against a real mongod at TEST_MONGODB_URL
+and are skipped when none is reachable; each test gets a fresh database."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+sys.path.insert(0, APP_DIR)
+
+os.environ["MONGODB_URL"] = os.environ.get("TEST_MONGODB_URL", "mongodb://localhost:27017")
+os.environ["SOFTWARE_NAME"] = os.environ.get("TEST_DATABASE", "app_tests")
+os.environ.setdefault("JWT_SECRET", "test-secret-at-least-32-bytes-long")
+os.environ.setdefault("SMTP_PORT", "25")
+os.environ.setdefault("SMTP_SERVER", "127.0.0.1")
+os.environ.setdefault("SMTP_STARTTLS", "false")
+os.environ.setdefault("EMAIL_FROM", "tests@localhost")
+# OAuth providers are served by tests/fake_providers.py, mounted in-process by tests/test_oauth.py
+os.environ["FACEBOOK_GRAPH_URL"] = "http://fakes/fb"
+os.environ["GOOGLE_TOKEN_URL"] = "http://fakes/google/token"
+
+import database  # noqa: E402
+from utils.user_cache import user_cache  # noqa: E402
+
+_mongo_reachable = None
+
+
+def mongo_reachable() -> bool:
+    global _mongo_reachable
+    if _mongo_reachable is None:
+        async def ping():
+            client = database.AsyncIOMotorClient(os.environ["MONGODB_URL"], serverSelectionTimeoutMS=1000)
+            try:
+                await client.admin.command("ping")
+            finally:
+                client.close()
+
+        try:
+            asyncio.run(ping())
+            _mongo_reachable = True
+        except Exception:
+            _mongo_reachable = False
+    return _mongo_reachable
+
+
+@pytest.fixture
+def run_with_db():
+    """Runs `test(db)` in a fresh event loop against an empty database"""
+    if not mongo_reachable():
+        pytest.skip(f"mongod is not reachable at {os.environ['MONGODB_URL']}")
+
+    def run(test):
+        async def main():
+            await database.init_db()
+            await database.client.drop_database(os.environ["SOFTWARE_NAME"])
+            await database.ensure_indexes()
+            try:
+                return await test(database.get_db())
+            finally:
+                await database.client.drop_database(os.environ["SOFTWARE_NAME"])
+                database.close_db()
+                user_cache.clear()
+
+        return asyncio.run(main())
+
+    return run
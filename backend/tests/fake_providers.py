@@ -0,0 +1,25 @@
+"""In-process stand-ins for the Facebook Graph API and Google's token endpoint,
+served at the FACEBOOK_GRAPH_URL and GOOGLE_TOKEN_URL set in conftest.py."""
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request
+
+app = FastAPI()
+
+
+@app.get("/fb/v12.0/oauth/access_token")
+async def facebook_token(code: str):
+    return {"access_token": code, "token_type": "bearer"}
+
+
+@app.get("/fb/me")
+async def facebook_me(access_token: str):
+    return {"id": access_token, "name": f"Test {access_token}", "email": f"{access_token}@facebook.example.com"}
+
+
+@app.post("/google/token")
+async def google_token(request: Request):
+    # Form-encoded like the real endpoint; parsed by hand so tests don't need python-multipart
+    form = parse_qs((await request.body()).decode())
+    code = form["code"][0]
+    return {"access_token": code, "id_token": f"id-token-{code}", "token_type": "Bearer"}
@@ -0,0 +1,47 @@
+import time
+
+from utils.mercadopago_gateway import CircuitBreaker
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_half_open_admits_a_single_probe():
+    breaker = open_breaker()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+def test_lost_probe_is_replaced_after_reset_timeout():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
@@ -0,0 +1,72 @@
+"""Every route that writes a user must be followed by reads that see the write,
+even though reads go through the user cache."""
+from datetime import datetime
+
+import httpx
+from main import app
+from utils.credit_operations import grant_payment_credits
+from utils.email_utils import create_verification_token
+
+EMAIL = "consistent@example.com"
+PASSWORD = "first-password"
+
+
+def auth_headers(tokens: dict) -> dict:
+    # The app sets Secure cookies, which an HTTP client won't send back on its own
+    return {"Cookie": f"access_token={tokens['access_token']}; refresh_token={tokens['refresh_token']}"}
+
+
+def test_reads_see_the_users_own_writes(run_with_db):
+    async def scenario(db):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            async def user_info(headers) -> dict:
+                response = await client.get("/auth/user", headers=headers)
+                assert response.status_code == 200, response.text
+                return response.json()
+
+            response = await client.post(
+                "/auth/register", json={"email": EMAIL, "username": "consistent", "password": PASSWORD}
+            )
+            assert response.status_code == 200, response.text
+            headers = auth_headers(response.json())
+            assert (await user_info(headers))["email_verified"] is False
+
+            response = await client.get("/auth/verify-email", params={"token": create_verification_token(EMAIL)})
+            assert response.status_code == 200, response.text
+            assert (await user_info(headers))["email_verified"] is True
+
+            response = await client.post("/legal/accept-terms", json={"accept": True}, headers=headers)
+            assert response.status_code == 200, response.text
+            assert (await user_info(headers))["terms_accepted"] is True
+
+            response = await client.post(
+                "/auth/change-password",
+                json={"old_password": PASSWORD, "new_password": "second-password"},
+                headers=headers,
+            )
+            assert response.status_code == 200, response.text
+            assert (await user_info(headers))["email"] == EMAIL
+            response = await client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+            assert response.status_code == 400
+            response = await client.post("/auth/login", json={"email": EMAIL, "password": "second-password"})
+            assert response.status_code == 200, response.text
+
+            user = await db.users.find_one({"email": EMAIL})
+            await db.payments.insert_one({
+                "user_id": user["_id"],
+                "payment_id": "consistency-1",
+                "status": "pending",
+                "amount": 20.0,
+                "payment_date": datetime.utcnow(),
+                "credits_added": False,
+            })
+            assert await grant_payment_credits("consistency-1", 20.0)
+            assert (await client.get("/payment/user_credits", headers=headers)).json()["credits"] == 20
+            assert (await user_info(headers))["credits"] == 20
+
+            response = await client.get("/test/credit-based-route", params={"credits_required": 3}, headers=headers)
+            assert response.status_code == 200, response.text
+            assert (await client.get("/payment/user_credits", headers=headers)).json()["credits"] == 17
+            assert (await user_info(headers))["credits"] == 17
+
+    run_with_db(scenario)
@@ -0,0 +1,94 @@
+import asyncio
+
+from utils import credit_leases as credit_leases_module
+from utils.credit_leases import CreditLeaseManager
+
+EMAIL = "lease@example.com"
+
+
+def test_expiry_racing_consumes_keeps_balances_exact(run_with_db):
+    async def scenario(db):
+        await db.users.insert_one({"email": EMAIL, "username": "lease", "credits": 100.0})
+        manager = CreditLeaseManager(block=10, duration=0.05)
+
+        async def spend():
+            for _ in range(10):
+                await manager.consume(EMAIL, 1)
+                await asyncio.sleep(0.01)
+
+        async def expire():
+            for _ in range(40):
+                await manager.release_expired()
+                await asyncio.sleep(0.005)
+
+        await asyncio.gather(spend(), spend(), expire())
+        await manager.release_all()
+
+        user = await db.users.find_one({"email": EMAIL})
+        assert user["credits"] == 80
+        assert user["reserved_credits"] == 0
+        assert user["credit_leases"] == []
+        assert manager._locks == {}
+
+    run_with_db(scenario)
+
+
+def test_sweeper_returns_leases_of_a_dead_worker_once(run_with_db):
+    async def scenario(db):
+        await db.users.insert_one({"email": EMAIL, "username": "lease", "credits": 100.0})
+        dead = CreditLeaseManager(block=10, duration=0.05)
+        await dead.consume(EMAIL, 1)
+
+        user = await db.users.find_one({"email": EMAIL})
+        assert (user["credits"], user["reserved_credits"]) == (90, 10)
+
+        await asyncio.sleep(0.15)
+        sweeper = CreditLeaseManager(block=10, duration=0.05)
+        assert await sweeper.sweep_stranded() == 1
+        assert await sweeper.sweep_stranded() == 0
+
+        # The original worker releasing late must not return the block a second time
+        await dead.release_all()
+        user = await db.users.find_one({"email": EMAIL})
+        assert (user["credits"], user["reserved_credits"], user["credit_leases"]) == (100, 0, [])
+
+    run_with_db(scenario)
+
+
+class SlowWrites:
+    """Database whose users.update_one yields for a while first, so other coroutines run mid-write"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def users(self):
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self.db.users, name)
+
+    async def update_one(self, *args, **kwargs):
+        await asyncio.sleep(0.02)
+        return await self.db.users.update_one(*args, **kwargs)
+
+
+def test_consume_during_release_is_persisted(run_with_db, monkeypatch):
+    async def scenario(db):
+        await db.users.insert_one({"email": EMAIL, "username": "lease", "credits": 100.0})
+        manager = CreditLeaseManager(block=10, duration=60)
+        await manager.consume(EMAIL, 8)
+        monkeypatch.setattr(credit_leases_module, "get_db", lambda: SlowWrites(db))
+
+        async def small_consume():
+            await asyncio.sleep(0.005)
+            return await manager.consume(EMAIL, 1)
+
+        # 5 doesn't fit in the 2 left, so the lease is released while the 1 comes in
+        await asyncio.gather(manager.consume(EMAIL, 5), small_consume())
+        await manager.release_all()
+
+        user = await db.users.find_one({"email": EMAIL})
+        assert (user["credits"], user["reserved_credits"], user["credit_leases"]) == (86, 0, [])
+
+    run_with_db(scenario)
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime
+
+from fastapi import HTTPException
+from utils.credit_operations import check_and_deduct_credits, deduct_credits_bulk, grant_payment_credits
+
+
+def test_concurrent_deductions_never_overdraw(run_with_db):
+    async def scenario(db):
+        await db.users.insert_one({"email": "a@example.com", "username": "a", "credits": 10.0})
+
+        results = await asyncio.gather(
+            *(check_and_deduct_credits("a@example.com", 1) for _ in range(50)),
+            return_exceptions=True
+        )
+
+        balances = [result for result in results if not isinstance(result, Exception)]
+        rejected = [result for result in results if isinstance(result, HTTPException)]
+        assert len(balances) == 10
+        assert len(rejected) == 40
+        assert all(error.status_code == 403 for error in rejected)
+        assert min(balances) >= 0
+        assert (await db.users.find_one({"email": "a@example.com"}))["credits"] == 0
+
+    run_with_db(scenario)
+
+
+def test_concurrent_bulk_and_single_deductions_never_overdraw(run_with_db):
+    emails = [f"user{i}@example.com" for i in range(5)]
+
+    async def scenario(db):
+        await db.users.insert_many([{"email": email, "username": email, "credits": 3.0} for email in emails])
+
+        async def single(email):
+            try:
+                await check_and_deduct_credits(email, 1)
+                return 1
+            except HTTPException:
+                return 0
+
+        charged = await asyncio.gather(
+            *(deduct_credits_bulk(dict.fromkeys(emails, 1.0)) for _ in range(10)),
+            *(single(email) for email in emails for _ in range(4)),
+        )
+
+        users = await db.users.find({"email": {"$in": emails}}).to_list(None)
+        assert all(user["credits"] >= 0 for user in users)
+        assert sum(charged) == 15 - sum(user["credits"] for user in users)
+        assert sum(charged) == 15
+
+    run_with_db(scenario)
+
+
+async def insert_pending_payment(db, payment_id: str, amount: float) -> dict:
+    user = {"email": "payer@example.com", "username": "payer", "credits": 0.0}
+    user["_id"] = (await db.users.insert_one(user)).inserted_id
+    await db.payments.insert_one({
+        "user_id": user["_id"],
+        "payment_id": payment_id,
+        "status": "pending",
+        "amount": amount,
+        "payment_date": datetime.utcnow(),
+        "credits_added": False,
+    })
+    return user
+
+
+def test_concurrent_grants_credit_once(run_with_db):
+    async def scenario(db):
+        user = await insert_pending_payment(db, "123", 25.0)
+
+        results = await asyncio.gather(*(grant_payment_credits("123", 25.0) for _ in range(10)))
+
+        assert results.count(True) == 1
+        assert (await db.users.find_one({"_id": user["_id"]}))["credits"] == 25.0
+        assert (await db.payments.find_one({"payment_id": "123"}))["credits_added"] is True
+
+    run_with_db(scenario)
+
+
+def test_grant_interrupted_before_flag_flip_is_not_repeated(run_with_db):
+    async def scenario(db):
+        user = await insert_pending_payment(db, "456", 10.0)
+        assert await grant_payment_credits("456", 10.0)
+        # As if the worker died after crediting the user but before flipping the flag
+        await db.payments.update_one({"payment_id": "456"}, {"$set": {"credits_added": False}})
+
+        assert not await grant_payment_credits(456, 10.0)
+        assert (await db.users.find_one({"_id": user["_id"]}))["credits"] == 10.0
+        assert (await db.payments.find_one({"payment_id": "456"}))["credits_added"] is True
+
+    run_with_db(scenario)
@@ -0,0 +1,118 @@
+import asyncio
+import socket
+from datetime import datetime
+
+import pytest
+from aiosmtpd.controller import Controller
+from utils.email_outbox import EmailOutbox
+from utils.email_utils import SMTPConnectionPool
+
+EMAIL = "outbox@example.com"
+
+
+class CollectingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 Message accepted"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    """A local aiosmtpd server; yields (port, handler)"""
+    handler = CollectingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller.port, handler
+    controller.stop()
+
+
+def make_outbox(port: int) -> EmailOutbox:
+    return EmailOutbox(
+        SMTPConnectionPool("127.0.0.1", port, size=1),
+        coalesce_window=60, poll_interval=0.05, lease=30, max_attempts=3, concurrency=1,
+    )
+
+
+async def wait_for(condition, timeout: float = 5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+def test_duplicate_verifications_are_sent_once(run_with_db, smtp_server):
+    port, handler = smtp_server
+
+    async def scenario(db):
+        outbox = make_outbox(port)
+        for _ in range(3):
+            await outbox.enqueue_verification(EMAIL)
+        worker = asyncio.create_task(outbox.run())
+        try:
+            await wait_for(lambda: handler.messages)
+            # Asked again inside the coalesce window: held back, not sent
+            await outbox.enqueue_verification(EMAIL)
+            await asyncio.sleep(0.3)
+        finally:
+            worker.cancel()
+            await outbox.close()
+
+        assert len(handler.messages) == 1
+        assert handler.messages[0].rcpt_tos == [EMAIL]
+        job = await db.email_outbox.find_one({"_id": f"verification:{EMAIL}"})
+        assert job["pending"] is True
+        assert job["not_before"] > datetime.utcnow()
+
+    run_with_db(scenario)
+
+
+def test_failed_send_backs_off_and_is_not_reclaimed(run_with_db):
+    async def scenario(db):
+        outbox = make_outbox(free_port())
+        await outbox.enqueue_verification(EMAIL)
+
+        job = await outbox._claim()
+        assert job["to"] == EMAIL
+        assert await outbox._claim() is None
+        await outbox._deliver(job)
+
+        job = await db.email_outbox.find_one({"_id": f"verification:{EMAIL}"})
+        assert (job["pending"], job["attempts"], outbox.failed) == (True, 1, 1)
+        assert (job["not_before"] - datetime.utcnow()).total_seconds() > 50
+        assert await outbox._claim() is None
+
+    run_with_db(scenario)
+
+
+def test_pool_reuses_a_connection_and_replaces_a_dropped_one(smtp_server):
+    port, handler = smtp_server
+    pool = SMTPConnectionPool("127.0.0.1", port, size=1)
+    outbox = make_outbox(port)
+
+    async def scenario():
+        await pool.send(outbox._build({"kind": "verification", "to": EMAIL}))
+        first = pool._idle[0]
+        await pool.send(outbox._build({"kind": "verification", "to": EMAIL}))
+        assert pool._idle == [first]
+
+        # Looks like a connection the server closed while it sat idle
+        first.close()
+        closed = []
+        close = pool._close
+        pool._close = lambda server: (closed.append(server), close(server))
+        await pool.send(outbox._build({"kind": "verification", "to": EMAIL}))
+        assert closed == [first]
+        assert pool._idle != [first]
+        await pool.close()
+
+    asyncio.run(scenario())
+    assert len(handler.messages) == 3
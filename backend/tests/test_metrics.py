@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+import main
+from fastapi import Depends, FastAPI
+from utils import security
+
+
+def scrape(client_host: str, headers: dict = None) -> int:
+    app = FastAPI()
+
+    @app.get("/metrics", dependencies=[Depends(security.require_metrics_access)])
+    async def metrics():
+        return {}
+
+    async def request():
+        transport = httpx.ASGITransport(app=app, client=(client_host, 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.get("/metrics", headers=headers)).status_code
+
+    return asyncio.run(request())
+
+
+def test_without_token_only_local_clients_are_served(monkeypatch):
+    monkeypatch.setattr(security, "METRICS_TOKEN", None)
+    assert scrape("127.0.0.1") == 200
+    assert scrape("10.0.0.1") == 403
+
+
+def test_token_is_required_when_configured(monkeypatch):
+    monkeypatch.setattr(security, "METRICS_TOKEN", "scrape-secret")
+    assert scrape("10.0.0.1", {"Authorization": "Bearer scrape-secret"}) == 200
+    assert scrape("10.0.0.1", {"Authorization": "Bearer wrong"}) == 401
+    assert scrape("127.0.0.1") == 401
+
+
+def test_queue_counts_are_reused_between_scrapes(monkeypatch):
+    calls = []
+
+    class Stats:
+        async def stats(self):
+            calls.append(self)
+            return {"depth": 0, "lag_seconds": 0, "pending": 0}
+
+    monkeypatch.setattr(main, "webhook_queue", Stats())
+    monkeypatch.setattr(main, "email_outbox", Stats())
+    monkeypatch.setattr(main, "queue_stats_refreshed_at", None)
+    monkeypatch.setattr(main, "METRICS_QUEUE_STATS_TTL", 60)
+
+    async def scrapes():
+        for _ in range(5):
+            await main.refresh_queue_gauges()
+
+    asyncio.run(scrapes())
+    assert len(calls) == 2
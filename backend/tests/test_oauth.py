@@ -0,0 +1,38 @@
+import asyncio
+
+import fake_providers
+import httpx
+import pytest
+from fastapi import FastAPI
+from routers import auth
+from utils import http_client
+from utils.google_auth import get_google_token
+
+
+@pytest.fixture
+def fake_upstreams(monkeypatch):
+    """Points the shared HTTP client at the fake providers, served in-process"""
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_providers.app), base_url="http://fakes")
+    monkeypatch.setattr(http_client, "http_client", client)
+    yield
+    asyncio.run(client.aclose())
+
+
+def test_google_token_exchange(fake_upstreams):
+    assert asyncio.run(get_google_token("abc", "http://test/auth/login/google/callback")) == "id-token-abc"
+
+
+def test_facebook_callback_creates_user(fake_upstreams, run_with_db):
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/auth")
+
+    async def scenario(db):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/auth/login/facebook/callback", params={"code": "alice"})
+        assert response.status_code == 200, response.text
+
+        user = await db.users.find_one({"email": "alice@facebook.example.com"})
+        assert user["facebook_id"] == "alice"
+        assert user["email_verified"] is True
+
+    run_with_db(scenario)
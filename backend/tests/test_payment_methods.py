@@ -0,0 +1,58 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from main import app
+from routers import payment
+from utils.mercadopago_gateway import mercadopago_gateway
+from utils.payment_methods import PaymentMethodIndex
+from utils.security import create_session_tokens
+
+CARD = {
+    "card_number": "4111111111111111",
+    "expiration_month": 12,
+    "expiration_year": 2030,
+    "security_code": "123",
+    "cardholder_name": "Test Payer",
+}
+
+
+async def unavailable():
+    return {"status": 500, "response": {}}
+
+
+def test_failed_first_load_is_a_503():
+    index = PaymentMethodIndex(unavailable, ttl=60)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(index.lookup("4111111111111111"))
+    assert error.value.status_code == 503
+
+
+def test_card_token_is_not_created_without_payment_methods(run_with_db, monkeypatch):
+    created_tokens = []
+
+    async def create_card_token(card_data):
+        created_tokens.append(card_data)
+        return {"status": 201, "response": {"id": "token"}}
+
+    monkeypatch.setattr(payment, "payment_method_index", PaymentMethodIndex(unavailable, ttl=60))
+    monkeypatch.setattr(mercadopago_gateway, "create_card_token", create_card_token)
+
+    async def scenario(db):
+        user_id = (await db.users.insert_one({"email": "card@example.com", "username": "card", "credits": 0})).inserted_id
+        access_token, _ = await create_session_tokens(str(user_id), "card@example.com")
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/payment/create_payment",
+                json={
+                    "payment": {"amount": "10.00", "description": "Credits", "payment_method": "credit_card"},
+                    "card": CARD,
+                },
+                headers={"Cookie": f"access_token={access_token}"},
+            )
+        assert response.status_code == 503, response.text
+        assert created_tokens == []
+
+    run_with_db(scenario)
@@ -0,0 +1,30 @@
+import asyncio
+import threading
+import time
+
+from utils.profiler import ProfileSession, sampling_profiler
+from utils.security import run_password_job
+
+
+def spin(seconds: float):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+def test_request_profile_includes_its_password_job():
+    async def scenario():
+        session = ProfileSession(
+            thread_id=threading.get_ident(), loop=asyncio.get_running_loop(), task=asyncio.current_task()
+        )
+        sampling_profiler.start(session)
+        try:
+            await run_password_job(spin, 0.2)
+        finally:
+            sampling_profiler.stop(session)
+        return session
+
+    session = asyncio.run(scenario())
+    hashing = [stack for stack in session.stacks if stack.startswith("password-hash") and "spin" in stack]
+    assert hashing
+    assert sum(session.stacks[stack] for stack in hashing) > 5
@@ -0,0 +1,57 @@
+import asyncio
+
+from fastapi import HTTPException
+from utils.rate_limit import AdaptiveConcurrencyLimiter
+
+
+async def hold(limiter: AdaptiveConcurrencyLimiter, seconds: float):
+    slot = limiter()
+    await slot.__anext__()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await slot.aclose()
+
+
+def test_slow_requests_without_queueing_keep_the_limit():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=4, max_limit=16, queue_target=0.2)
+        for _ in range(20):
+            # A cheap request next to an expensive one, e.g. an unknown email next to a bcrypt check
+            await asyncio.gather(hold(limiter, 0), hold(limiter, 0.02))
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.limit == 4
+    assert limiter.shed == 0
+
+
+def test_saturated_with_short_queue_grows():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=2, max_limit=16, queue_target=0.5)
+        for _ in range(10):
+            await asyncio.gather(*(hold(limiter, 0.005) for _ in range(3)))
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.limit > 2
+    assert limiter.shed == 0
+
+
+def test_standing_queue_shrinks_to_the_initial_limit():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=2, max_limit=16, queue_target=0.1)
+        limiter.limit = 8.0
+        # Requests keep arriving faster than they complete, so the queue never drains
+        requests = []
+        for _ in range(150):
+            requests.append(asyncio.create_task(hold(limiter, 0.08)))
+            await asyncio.sleep(0.005)
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        return limiter, results
+
+    limiter, results = asyncio.run(scenario())
+    # Requests admitted straight away while the queue drains may nudge it back up a little
+    assert int(limiter.limit) == 2
+    assert limiter.shed > 0
+    assert all(error.status_code == 503 for error in results if isinstance(error, HTTPException))
@@ -0,0 +1,66 @@
+import asyncio
+
+from utils import user_cache as user_cache_module
+from utils.user_cache import user_cache
+
+EMAIL = "cached@example.com"
+
+
+class PausedUsers:
+    """users collection whose find_one holds its result until resumed, to interleave a write"""
+
+    def __init__(self, db):
+        self.db = db
+        self.reads = 0
+        self.read = asyncio.Event()
+        self.resume = asyncio.Event()
+        self.resume.set()
+
+    @property
+    def users(self):
+        return self
+
+    async def find_one(self, *args, **kwargs):
+        self.reads += 1
+        user = await self.db.users.find_one(*args, **kwargs)
+        self.read.set()
+        await self.resume.wait()
+        return user
+
+
+def test_miss_racing_a_write_does_not_cache_the_old_document(run_with_db, monkeypatch):
+    async def scenario(db):
+        user_id = (await db.users.insert_one({"email": EMAIL, "username": "cached", "credits": 5.0})).inserted_id
+        paused = PausedUsers(db)
+        monkeypatch.setattr(user_cache_module, "get_db", lambda: paused)
+
+        for lookup in (lambda: user_cache.get_by_email(EMAIL), lambda: user_cache.get_by_id(user_id)):
+            paused.read.clear()
+            paused.resume.clear()
+            read = asyncio.create_task(lookup())
+            await paused.read.wait()
+
+            await db.users.update_one({"_id": user_id}, {"$inc": {"credits": 1}})
+            user_cache.invalidate(EMAIL)
+            paused.resume.set()
+            await read
+
+            credits = (await db.users.find_one({"_id": user_id}))["credits"]
+            assert (await user_cache.get_by_email(EMAIL))["credits"] == credits
+            user_cache.invalidate(EMAIL)
+
+    run_with_db(scenario)
+
+
+def test_miss_without_writes_is_cached(run_with_db, monkeypatch):
+    async def scenario(db):
+        user_id = (await db.users.insert_one({"email": EMAIL, "username": "cached", "credits": 5.0})).inserted_id
+        paused = PausedUsers(db)
+        monkeypatch.setattr(user_cache_module, "get_db", lambda: paused)
+
+        await user_cache.get_by_email(EMAIL)
+        await user_cache.get_by_email(EMAIL)
+        await user_cache.get_by_id(user_id)
+        assert paused.reads == 1
+
+    run_with_db(scenario)
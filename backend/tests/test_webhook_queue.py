@@ -0,0 +1,43 @@
+from utils.webhook_queue import WebhookQueue
+
+
+def make_queue() -> WebhookQueue:
+    return WebhookQueue(workers=1, poll_interval=1, lease=60, max_attempts=3)
+
+
+def test_notifications_without_event_id_are_all_kept(run_with_db):
+    async def scenario(db):
+        queue = make_queue()
+        update = {"type": "payment", "action": "payment.updated", "data": {"id": "77"}}
+        # e.g. pending -> in_process -> approved, each notified with the same body
+        for _ in range(3):
+            await queue.enqueue(update)
+
+        assert await db.webhook_events.count_documents({"payment_id": "77"}) == 3
+        assert queue.duplicates == 0
+
+    run_with_db(scenario)
+
+
+def test_redelivered_event_id_is_dropped(run_with_db):
+    async def scenario(db):
+        queue = make_queue()
+        event = {"id": 123, "type": "payment", "action": "payment.updated", "data": {"id": "77"}}
+        await queue.enqueue(event)
+        await queue.enqueue(event)
+
+        assert await db.webhook_events.count_documents({}) == 1
+        assert queue.duplicates == 1
+
+    run_with_db(scenario)
+
+
+def test_malformed_notifications_are_ignored(run_with_db):
+    async def scenario(db):
+        queue = make_queue()
+        for data in ({"type": "payment", "data": "77"}, {"type": "payment", "data": None}, {"type": "payment"}):
+            await queue.enqueue(data)
+
+        assert await db.webhook_events.count_documents({}) == 0
+
+    run_with_db(scenario)